@@ -1,16 +1,39 @@
 # app.py
 import os,sys
+from utils import startup  # First, so the startup report covers every import
 import dash
 from dash import dcc
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output
 import sqlite3
 
+from utils.export import export_blueprint
+from utils.export_jobs import export_jobs_blueprint
+from utils.stats import stats_blueprint
+from utils import metrics, refresher
+
+startup.mark('imports')
+
 # Initialize the Dash app with Bootstrap
 app = dash.Dash(__name__, 
                 external_stylesheets=[dbc.themes.BOOTSTRAP],
-                use_pages=True)  # Enable pages
+                use_pages=True,  # Enable pages
+                compress=True)  # gzip/brotli callback responses (flask-compress)
 app.title = "Harmstatus Dashboard"
+startup.mark('pages')  # Page modules are imported while the app is created
+
+# Streaming TSV export, export job downloads, cache statistics and /metrics routes
+app.server.register_blueprint(export_blueprint)
+app.server.register_blueprint(export_jobs_blueprint)
+app.server.register_blueprint(stats_blueprint)
+
+# Time every callback request and record its payload sizes
+metrics.instrument(app)
+
+# Optional background refresher: keeps data and figure caches warm so
+# callbacks never wait on the backend
+if os.environ.get('HARMSTATUS_BACKGROUND_REFRESH') == '1':
+    refresher.start()
 
 # Define the layout of the app
 app.layout = dbc.Container([
@@ -26,6 +49,8 @@ app.layout = dbc.Container([
     dash.page_container  # This will display the current page content
 ], fluid=True)
 
+startup.finish()
+
 if __name__ == "__main__":
     #port = int(os.environ.get("PORT", 8050))  # Render provides PORT env
     #app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,187 @@
+# benchmarks/run.py
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+
+# Catalogue sizes benchmarked by default
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# Filter panel state replayed through update_table_filters
+dropdown_filters = {'Harm_status': ['harmonised', 'failed'], 'Raw_genome_build': ['GRCh37']}
+text_filters = {'PMID': '', 'First_author': 'smi'}
+comparison_filters = {'Harm_drop_rate': ('>', 0.1), 'Raw_N_variants': (None, None), 'Liftover_drop_rate': (None, None)}
+sort_by = [{'column_id': 'Harm_drop_rate', 'direction': 'desc'}]
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MiB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # Bytes on macOS, KiB elsewhere
+
+def payload_bytes(output):
+    """
+    Size of a callback's return value as Dash serializes it for the browser
+    """
+    from plotly.io.json import to_json_plotly
+    return len(to_json_plotly(output).encode())
+
+def measure(name, call, repeat, cold, size=payload_bytes):
+    """
+    Time repeated calls of one callback. The first call is reported apart,
+    as it is the only one that may miss every cache unless cold is set, in
+    which case all named caches are cleared before each call
+    """
+    from utils.cache import cache_registry
+
+    rss_before = peak_rss_mb()
+    timings, output = [], None
+    for _ in range(repeat + 1):
+        if cold:
+            for cache in cache_registry.values():
+                cache.clear()
+        start = time.perf_counter()
+        output = call()
+        timings.append(time.perf_counter() - start)
+
+    first, rest = timings[0], np.array(timings[1:] or timings) * 1000
+    return output, {
+        'callback': name,
+        'first_ms': first * 1000,
+        'p50_ms': float(np.percentile(rest, 50)),
+        'p95_ms': float(np.percentile(rest, 95)),
+        'p99_ms': float(np.percentile(rest, 99)),
+        'max_ms': float(rest.max()),
+        'payload_bytes': size(output),
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - rss_before,
+    }
+
+def run_export_job(version, filter_query, columns, export_format):
+    """
+    Submit an export job and wait for it; returns the artifact path
+    """
+    from utils import export_jobs
+
+    key = export_jobs.submit(version, filter_query, [col['id'] for col in columns], [], export_format)
+    while export_jobs.status(key)['status'] not in ('done', 'failed'):
+        time.sleep(0.01)
+    return export_jobs.artifact_path(key)
+
+def run_worker(repeat, cold):
+    """
+    Call the dashboard callbacks directly against the backend configured in
+    HARMSTATUS_BACKEND_URL and return one result row per callback
+    """
+    from app import app
+    import pages.table as table
+    import pages.plot as plot
+    from utils import export_jobs
+
+    results = []
+    def bench(name, call, **kwargs):
+        output, row = measure(name, call, repeat, cold, **kwargs)
+        results.append(row)
+        return output
+
+    version, _, _ = bench('load_data', lambda: table.load_data(None))
+    if not version:
+        raise SystemExit("The backend returned no studies")
+    columns = bench('update_selected_table', lambda: table.update_selected_table(version))
+    bench('create_filter_dropdowns', lambda: table.create_filter_dropdowns(version))
+
+    filter_query, _ = bench('update_table_filters', lambda: table.update_table_filters(
+        1,
+        list(dropdown_filters.values()), [{'type': 'filter-dropdown', 'column': col} for col in dropdown_filters],
+        list(text_filters.values()), [{'type': 'text-filter', 'column': col} for col in text_filters],
+        [op for op, _ in comparison_filters.values()], [value for _, value in comparison_filters.values()],
+        [{'type': 'comparison-operator', 'column': col} for col in comparison_filters],
+    ))
+    bench('update_table_page', lambda: table.update_table_page(version, 0, 10, sort_by, filter_query, columns, [], None))
+
+    url, *_ = bench('download_tsv', lambda: table.download_tsv(1, version, filter_query, columns, [], 'tsv', None, {}))
+    client = app.server.test_client()
+    for name, export_url in [('export_tsv', url), ('export_tsv_gzip', url + '?gzip=1')]:
+        # The streamed file the browser downloads; payload is the response body
+        bench(name, lambda: client.get(export_url).get_data(), size=len)
+
+    for export_format in export_jobs.available_formats():
+        # Export jobs until their artifact is ready; repeats are artifact cache hits
+        bench(f'export_job[{export_format}]', lambda: run_export_job(version, filter_query, columns, export_format), size=os.path.getsize)
+
+    for source in ('local', 'backend'):
+        plot.PLOT_SOURCE = source
+        bench(f'update_plots[{source}]', lambda: plot.update_plots(None))
+    return results
+
+def start_stub(studies):
+    """
+    Start the stub backend in a subprocess on a free port; returns (process, URL)
+    """
+    stub = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.stub_backend', '--studies', str(studies), '--port', '0'],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = stub.stdout.readline()
+    if not line.startswith('ready '):
+        stub.kill()
+        raise RuntimeError(f"Stub backend for {studies} studies did not start")
+    return stub, line.split()[1]
+
+def run_size(studies, repeat, cold):
+    """
+    Benchmark one catalogue size in a fresh worker process, so peak RSS and
+    caches are not carried over between sizes
+    """
+    stub, url = start_stub(studies)
+    try:
+        env = dict(os.environ, HARMSTATUS_BACKEND_URL=url)
+        command = [sys.executable, '-m', 'benchmarks.run', '--worker', '--repeat', str(repeat)]
+        if cold:
+            command.append('--cold')
+        worker = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True, check=True)
+    finally:
+        stub.terminate()
+        stub.wait()
+    return [dict(row, studies=studies) for row in json.loads(worker.stdout)]
+
+def print_report(rows):
+    header = f"{'studies':>8}  {'callback':<24}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'payload B':>12}{'peak RSS MiB':>14}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['studies']:>8}  {row['callback']:<24}{row['first_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+            f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['payload_bytes']:>12}{row['peak_rss_mb']:>14.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks against synthetic catalogues")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="catalogue sizes, in studies")
+    parser.add_argument('--repeat', type=int, default=20, help="calls per callback after the first")
+    parser.add_argument('--cold', action='store_true', help="clear the caches before every call")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_worker(args.repeat, args.cold)
+        print(json.dumps(results))
+        return
+
+    rows = []
+    for studies in args.sizes:
+        rows += run_size(studies, args.repeat, args.cold)
+    print_report(rows)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# benchmarks/startup.py
+import os
+import sys
+import json
+import time
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cold-start cost of a dashboard worker")
+    parser.add_argument('--limit', type=int, default=25, help="number of slowest imports to list")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Must be set before utils.startup is imported by the app
+    os.environ['HARMSTATUS_IMPORT_PROFILE'] = '1'
+    from app import app
+    from utils import startup
+
+    # The first request builds the layouts and the callback map
+    start = time.perf_counter()
+    app.server.test_client().get('/')
+    first_request = time.perf_counter() - start
+
+    report = dict(startup.report(args.limit), first_request_seconds=first_request)
+    report['heavy_modules_loaded'] = [name for name in ('pandas', 'numpy', 'plotly.express', 'requests') if name in sys.modules]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"startup {report['startup_seconds']:.3f}s, first request {first_request:.3f}s")
+    for phase, seconds in report['phases'].items():
+        print(f"  {phase:<10}{seconds:>8.3f}s")
+    print(f"{'module':<50}{'self ms':>10}{'total ms':>10}")
+    for row in report['imports']:
+        print(f"{row['module']:<50}{row['self_ms']:>10.1f}{row['total_ms']:>10.1f}{'  (deferred)' if row['deferred'] else ''}")
+    print("heavy modules loaded:", ', '.join(report['heavy_modules_loaded']) or 'none')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/stub_backend.py
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+from utils import aggregates
+
+# Values of the categorical columns of the synthetic catalogue
+categories = {
+    'First_author': ['Smith J', 'Jones A', 'Li X', 'Garcia M', 'Okafor C', 'Müller K'],
+    'Genotyping_type': ['array', 'sequencing', 'mix'],
+    'Effect_size_type': ['OR', 'BETA', 'HR', None],
+    'Raw_genome_build': ['GRCh37', 'GRCh38', 'NCBI36'],
+    'Raw_coordinate_system': ['1-based', '0-based'],
+    'Harm_status': ['harmonised', 'failed', 'pending', 'running'],
+    'Harm_account': ['gwas_ebi', 'gwas_sanger', 'gwas_dev'],
+    'Harm_exitcode': ['0', '1', '137', None],
+    'Harm_failstep': [None, 'qc', 'liftover', 'map_to_build'],
+}
+
+def make_catalogue(studies, seed=0):
+    """
+    Synthetic study list shaped like the backend's "/" route, with the same
+    column names and value types (drop rates as strings, as the backend sends them)
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2016-01-01')
+    days = (np.datetime64('today') - start).astype(int)
+
+    df = pd.DataFrame({
+        'Study': [f"GCST{i:08d}" for i in range(studies)],
+        'PMID': (30000000 + rng.integers(0, 1000000, studies)).astype(str),
+    })
+    for col, values in categories.items():
+        df[col] = np.array(values, dtype=object)[rng.integers(0, len(values), studies)]
+    df['Raw_N_variants'] = rng.integers(1000, 9000000, studies)
+    df['Latest_harm_start_date'] = (start + rng.integers(0, days, studies).astype('timedelta64[D]')).astype(str)
+    df['Harm_drop_rate'] = np.round(rng.beta(2, 12, studies), 4).astype(str)
+    df['Liftover_drop_rate'] = np.round(rng.beta(1, 40, studies), 4)
+    return df
+
+def make_routes(catalogue):
+    """
+    JSON body of every stub route: "/" and the precomputed plotly/* endpoints
+    """
+    tables = aggregates.summary_tables(catalogue.assign(Harm_drop_rate=pd.to_numeric(catalogue['Harm_drop_rate'])))
+    routes = {
+        '/': catalogue.to_json(orient='records'),
+        '/plotly/status_bar': tables['status'].to_json(orient='records'),
+        '/plotly/harmed_six_month': tables['newly_harmonised'].to_json(orient='records'),
+    }
+    for name in aggregates.genotyping_types:
+        routes[f'/plotly/drop_rate/{name}'] = tables[name].to_json(orient='records')
+    return {path: body.encode() for path, body in routes.items()}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the precomputed routes with an ETag, answering 304 to a matching
+    If-None-Match like the real backend's conditional GET support
+    """
+    protocol_version = 'HTTP/1.1'
+    routes = {}
+    etags = {}
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        body = self.routes.get(path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = self.etags[path]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(studies, host='127.0.0.1', port=8000, seed=0):
+    """
+    Start the stub backend in a daemon thread and return the server
+    """
+    routes = make_routes(make_catalogue(studies, seed))
+    handler = type('Handler', (StubHandler,), {
+        'routes': routes,
+        'etags': {path: '"' + hashlib.sha1(body).hexdigest() + '"' for path, body in routes.items()},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='stub-backend').start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub harmonisation status backend over a synthetic catalogue")
+    parser.add_argument('--studies', type=int, default=10000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve(args.studies, args.host, args.port, args.seed)
+    print(f"ready http://{args.host}:{server.server_port}/", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,220 @@
 # pages/plot.py
 import dash
-from dash import html, dcc, callback, Input, Output
-import pandas as pd
-import plotly.express as px
-from plotly.subplots import make_subplots
-import plotly.graph_objs as go
+from dash import html, dcc, callback, Input, Output, State, Patch, no_update
 from datetime import datetime, timedelta
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from dash.exceptions import PreventUpdate
+import os
+
+from utils import aggregates, background, backend, dataset, history, metrics, refresher, schema, shared_cache
+from utils.cache import TTLCache
+from utils.lazy import lazy_import
+
+# Imported on first use, so workers start without loading them
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objs')
+subplots = lazy_import('plotly.subplots')
+requests = lazy_import('requests')
 
 # Register this file as a page
 dash.register_page(__name__, path="/plot", title="Summary Plot")
 
-# Define the layout - don't run data fetch during import
-
-layout = html.Div([
-    html.H2("Summary Plot"),
-    dcc.Graph(id="Status-Distribution-plot"),
-    dcc.Graph(id="Newly-harmonised-plot"),
-    dcc.Graph(id="Dropping-rate-plot"),
-    html.Div(id="plot-error-message"),
-    dcc.Interval(
-        id="interval-update",
-        interval=5 * 1000,  # Update every 5 seconds (adjust as needed)
-        n_intervals=0,
+# Seconds between checks of the summary endpoints for new data
+REFRESH_SECONDS = 5
+
+# Seconds the figures wait for the summary endpoints; routes that are later
+# are listed as still loading and drawn by a later refresh
+PLOT_FETCH_SECONDS = float(os.environ.get('HARMSTATUS_PLOT_FETCH_SECONDS', 5))
+
+# Large-data mode of the drop-rate panels: WebGL above SCATTERGL_POINTS
+# points, and per-year binned summaries above DENSITY_POINTS visible points
+SCATTERGL_POINTS = int(os.environ.get('HARMSTATUS_SCATTERGL_POINTS', 5000))
+DENSITY_POINTS = int(os.environ.get('HARMSTATUS_DENSITY_POINTS', 20000))
+RATE_BIN_WIDTH = 0.01
+
+# Where the summary tables come from: 'local' aggregates the study list
+# fetched for the table page (one backend call), 'backend' fetches the
+# precomputed plotly/* endpoints
+PLOT_SOURCE = os.environ.get('HARMSTATUS_PLOT_SOURCE', 'local')
+
+# Time ranges of the status trend plot, in days (0: everything recorded, as
+# RadioItems values cannot be None)
+trend_ranges = [('7 days', 7), ('30 days', 30), ('90 days', 90), ('1 year', 365), ('All', 0)]
+
+# The layout is built on request rather than at import, and does not fetch data
+def layout(**kwargs):
+    return html.Div([
+        html.H2("Summary Plot"),
+        dcc.Graph(id="Status-Distribution-plot"),
+        dcc.Graph(id="Newly-harmonised-plot"),
+        dcc.Graph(id="Dropping-rate-plot"),
+        html.Div(id="plot-error-message"),
+        dcc.Interval(
+            id="interval-update",
+            interval=REFRESH_SECONDS * 1000,  # Update every 5 seconds (adjust as needed)
+            n_intervals=0,
+        ),
+        # Versions of the plotted endpoint responses, to patch only what changed
+        dcc.Store(id="plot-data-version"),
+        # Status trend from the local history store, if enabled
+        html.Div([
+            dcc.RadioItems(
+                id="trend-range",
+                options=[{'label': label, 'value': days} for label, days in trend_ranges],
+                value=30,
+                inline=True,
+                inputStyle={'marginRight': '5px', 'marginLeft': '15px'}
+            ),
+            dcc.Graph(id="Status-trend-plot"),
+            dcc.Store(id="trend-revision"),
+            # Drop rate history of individual studies
+            dcc.Input(
+                id="trend-studies",
+                type="text",
+                debounce=True,
+                placeholder="Study accessions, comma-separated",
+                style={'width': '100%'}
+            ),
+            dcc.Graph(id="Drop-rate-trend-plot"),
+            dcc.Store(id="drop-rate-trend-revision")
+        ]) if history.enabled else None
+        ],
+        style={
+            'width': '100%', 
+            'height': '100vh', 
+            'display': 'flex', 
+            'flexDirection': 'column'}
     )
-    ],
-    style={
-        'width': '100%', 
-        'height': '100vh', 
-        'display': 'flex', 
-        'flexDirection': 'column'}
-)
 
-def get_data(route): 
-    try:
-        base="http://127.0.0.1:8000/"
-        URL = base + route
-        response = requests.get(URL)
-        return pd.DataFrame(response.json())
-    except requests.exceptions.RequestException:
-        return []
+# Summary endpoints, fetched concurrently on each update
+plot_routes = {
+    'status': "plotly/status_bar",
+    'newly_harmonised': "plotly/harmed_six_month",
+    'array': "plotly/drop_rate/array",
+    'sequencing': "plotly/drop_rate/sequencing",
+    'mix': "plotly/drop_rate/mix",
+}
 
-# Create callback to load the data and generate the plot
-@callback(
-    Output("Status-Distribution-plot", "figure"),
-    Output("Newly-harmonised-plot", "figure"),
-    Output("Dropping-rate-plot", "figure"),
-    Output("plot-error-message", "children"),
-    Input("Status-Distribution-plot", "id")
-)
+# Bounded pool shared by all sessions, so one page load costs ~one round trip
+fetch_pool = ThreadPoolExecutor(max_workers=len(plot_routes), thread_name_prefix="plot-fetch")
 
+# Summary tables aggregated locally, per dataset version
+aggregate_cache = TTLCache(maxsize=4, name='aggregates')
 
-def update_plots(_):
-    # Status Distribution Plot
-    status_table=get_data("plotly/status_bar")
-    status_table['Harm_status'] = status_table['Harm_status'].str.strip()
+# Typed summary tables of the backend endpoints, per (route, response version)
+table_cache = TTLCache(maxsize=2 * len(plot_routes), name='plot_tables')
+
+def fetch_plot_data(max_age=None, refresh=False):
+    """
+    Load the summary tables. Returns the DataFrames that loaded, their
+    versions and an error message for each table that did not
+    """
+    if PLOT_SOURCE == 'local':
+        return aggregate_plot_data(max_age, refresh)
+    return fetch_backend_plot_data(max_age, refresh)
+
+def aggregate_plot_data(max_age=None, refresh=False):
+    """
+    Derive every summary table from the cached study list, so the plots cost
+    one backend call and always agree with the table page
+    """
+    version = dataset.load_dataset(max_age=max_age, refresh=refresh)
+    if not version:
+        return {}, {}, {name: f"Could not load the study list for {name}" for name in plot_routes}
+
+    windows = (aggregates.RECENT_MONTHS, aggregates.DROP_RATE_YEARS, aggregates.DROP_RATE_THRESHOLD)
+    # Windows are relative to today, so the date is part of the version
+    key = f"{version}:{pd.Timestamp.now():%Y-%m-%d}:{windows}"
+    results = aggregate_cache.get(key)
+    if results is None:
+        with metrics.timed(metrics.stage_seconds, stage='aggregate'):
+            results = aggregates.summary_tables(dataset.get_dataset(version))
+        aggregate_cache.set(key, results)
+
+    # Shared with other calls: the figure builders do not modify their input
+    return dict(results), {name: key for name in results}, {}
+
+def fetch_backend_plot_data(max_age=None, refresh=False):
+    """
+    Fetch every summary endpoint in parallel. Returns the DataFrames that
+    loaded within PLOT_FETCH_SECONDS, their response versions and an error
+    message for each route that did not. A late route is served from its
+    previous response, if any; its fetch keeps running and fills the
+    response cache for the next refresh
+    """
+    futures = {
+        name: fetch_pool.submit(backend.get_versioned, route, max_age, refresh)
+        for name, route in plot_routes.items()
+    }
+    done, _ = wait(futures.values(), timeout=PLOT_FETCH_SECONDS)
+
+    results, versions, errors = {}, {}, {}
+    for name, future in futures.items():
+        route = plot_routes[name]
+        if future not in done:
+            previous = backend.response_cache.get(route)
+            if previous is None:
+                errors[name] = f"{route} is still loading"
+                continue
+            errors[name] = f"{route} is slow to respond, showing its previous data"
+            versions[name], data = previous.version, previous.data
+        else:
+            try:
+                versions[name], data = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                errors[name] = f"Could not load {route}: {e}"
+                continue
+        results[name] = typed_table(route, versions[name], data)
+    return results, versions, errors
+
+def typed_table(route, version, data):
+    """
+    The typed DataFrame of an endpoint response, built once per response version
+    """
+    key = (route, version)
+    table = table_cache.get(key)
+    if table is None:
+        table = schema.apply(pd.DataFrame(data))
+        table_cache.set(key, table)
+    return table
+
+# Figure JSON keyed on the versions of the responses it was built from, shared
+# by every session of this process
+figure_cache = TTLCache(maxsize=32, name='figures')
+
+def cached_figure(key, build):
+    """
+    Return the cached figure dict for key, building and caching it on a miss
+    """
+    figure = figure_cache.get(key)
+    if figure is None:
+        # Built once across all workers when the shared cache is enabled
+        figure = shared_cache.get_or_build('figure:' + repr(key), lambda: build_figure(build))
+        shared_cache.prune('figure:', keep=figure_cache.maxsize)
+        figure_cache.set(key, figure)
+    return figure
+
+def build_figure(build):
+    with metrics.timed(metrics.stage_seconds, stage='figure'):
+        return build().to_dict()
+
+def drop_rate_key(versions):
+    return ('drop_rate',) + tuple(versions.get(name) for name, _, _ in drop_rate_panels)
+
+def empty_figure(title):
+    fig = go.Figure()
+    fig.update_layout(
+        title=title,
+        xaxis={'visible': False},
+        yaxis={'visible': False},
+        annotations=[{'text': 'Data unavailable', 'showarrow': False, 'font': {'size': 16}}]
+    )
+    return fig
+
+def build_status_figure(status_table):
+    status_table = status_table.assign(Harm_status=status_table['Harm_status'].str.strip())
 
     fig1 = px.bar(
         status_table,
@@ -66,140 +226,391 @@ def update_plots(_):
         color='Harm_status'
         )
     fig1.update_layout(xaxis={'categoryorder':'total descending'}) 
-    
-    # Newly Harmonised Plot 
-    # Newly harmonised data in the last 6 month (Bar Chart)
-    newly_harmonised = get_data("plotly/harmed_six_month")
+    return fig1
+
+def newly_harmonised_title():
+    if PLOT_SOURCE == 'local':
+        return f'Newly Harmonised Sumstats (Recent {aggregates.RECENT_MONTHS} months)'
+    return 'Newly Harmonised Sumstats (Recent 6 months)'
 
+def drop_rate_title():
+    if PLOT_SOURCE == 'local':
+        return (f"Harmonisation Drop Rate Plots (Past {aggregates.DROP_RATE_YEARS} Years) "
+                f"with dropping rate > {aggregates.DROP_RATE_THRESHOLD:g}")
+    return "Harmonisation Drop Rate Plots (Past 10 Years) with dropping rate > 0.15"
+
+def build_newly_harmonised_figure(newly_harmonised):
+    # Newly harmonised data in the last 6 month (Bar Chart)
     fig2 = px.bar(
         newly_harmonised, 
         x='month',
         y='num_studies',
         text='num_studies',
-        title='Newly Harmonised Sumstats (Recent 6 months)'
+        title=newly_harmonised_title()
         )
-    
-    # Dropping Rate Plot by year
-    # Fig3.1: For sequencing data
-    # Fig 3.2: For Array data
-    # Fig 3.3: For combined data
+    return fig2
 
-    fig3 = make_subplots(rows=1, cols=3, subplot_titles=["Array Drop Rate", "Sequencing Drop Rate", "mix Drop Rate"])
-
-    # Subplot 1: Drop Rate by Account
-    array_data=get_data("plotly/drop_rate/array")
-    array_data['Harm_drop_rate'] =  array_data['Harm_drop_rate'].astype(float)
-    array_data['year'] =  array_data['year'].astype(int)
-    sequencing_data=get_data("plotly/drop_rate/sequencing")
-    sequencing_data['Harm_drop_rate'] =  sequencing_data['Harm_drop_rate'].astype(float)
-    sequencing_data['year'] =  sequencing_data['year'].astype(int)
-    mix_data=get_data("plotly/drop_rate/mix")
-    mix_data['Harm_drop_rate'] =  mix_data['Harm_drop_rate'].astype(float)
-    mix_data['year'] =  mix_data['year'].astype(int)
-
-    fig3.add_trace(
-        go.Scatter(
-            y=array_data["Harm_drop_rate"],
-            x=array_data["year"],
-            name="Array Drop Rate",
-            mode='markers',  # Show markers with text labels
-            text=array_data['Study'],  # Show study names
-            textposition='top center',  # Position text labels
-            marker=dict(
-                size=8,  # Size of markers
-                color=array_data["Harm_drop_rate"], 
-                colorscale='Viridis',  # Color scale
-                #showscale=True  # Show color scale
-                ),
-            ),
-        row=1, col=1
+# Drop rate subplots: (data key, subplot title, threshold line)
+drop_rate_panels = [
+    ('array', "Array Drop Rate", 0.15),
+    ('sequencing', "Sequencing Drop Rate", 0.2),
+    ('mix', "mix Drop Rate", None),
+]
+
+def drop_rate_panel_data(data, year_range=None):
+    """
+    Trace arrays for one drop-rate panel, limited to year_range if given.
+    Above DENSITY_POINTS points, studies are binned per year and drop rate
+    and each bin is drawn as one marker sized by its study count
+    """
+    rates = data['Harm_drop_rate']
+    years = data['year']
+    unique_years = np.sort(years.dropna().unique())
+    panel = dict(
+        tickvals=unique_years.tolist(),
+        ticktext=[str(year) for year in unique_years],
+        type='scattergl' if len(data) > SCATTERGL_POINTS else 'scatter'
     )
 
-    fig3.add_hline(
-        y=0.15,  # 0.2 corresponds to 20%
-        line=dict(
-            color='red',  # Color of the line
-            width=2,  # Line width
-            dash='dash'  # Line style, e.g., 'dash', 'dot', 'solid'
-            ),
-            row=1, col=1  # Add to the 1st subplot (Array Drop Rate)
-            )
-    
-     # Subplot 2: Drop Rate by Study
-
-    fig3.add_trace(
-        go.Scatter(
-            y=sequencing_data["Harm_drop_rate"],
-            x=sequencing_data["year"],
-            name="Array Drop Rate",
-            mode='markers',  # Show markers with text labels
-            text=array_data['Study'],  # Show study names
-            textposition='top center',  # Position text labels
-            marker=dict(
-                size=8,  # Size of markers
-                color=array_data["Harm_drop_rate"], 
-                colorscale='Viridis',  # Color scale
-                #showscale=True  # Show color scale
-                ),
-            ),
-        row=1, col=2
+    if year_range is not None:
+        visible = years.between(*year_range).to_numpy()
+        rates, years, studies = rates[visible], years[visible], data['Study'][visible]
+    else:
+        studies = data['Study']
+
+    if len(rates) <= DENSITY_POINTS:
+        return dict(panel, x=years.tolist(), y=rates.tolist(), text=studies.tolist(), color=rates.tolist(), size=8)
+
+    # Binned summary: one marker per (year, drop rate bin)
+    bins = pd.DataFrame({'year': years.to_numpy(), 'bin': np.floor(rates.to_numpy() / RATE_BIN_WIDTH)})
+    counts = bins.groupby(['year', 'bin']).size().reset_index(name='count')
+    centres = (counts['bin'] + 0.5) * RATE_BIN_WIDTH
+    sizes = 4 + 16 * np.sqrt(counts['count'] / counts['count'].max())
+    return dict(
+        panel,
+        x=counts['year'].tolist(),
+        y=centres.tolist(),
+        text=[f"{count} {'study' if count == 1 else 'studies'}" for count in counts['count']],
+        color=centres.tolist(),
+        size=sizes.round(1).tolist()
     )
 
-    fig3.add_hline(
-        y=0.2,  # 0.2 corresponds to 20%
-        line=dict(
-            color='red',  # Color of the line
-            width=2,  # Line width
-            dash='dash'  # Line style, e.g., 'dash', 'dot', 'solid'
-            ),
-            row=1, col=2  # Add to the 1st subplot (Array Drop Rate)
-            )
-    
-    # Subplot 3: Drop Rate by Date
-    
-    fig3.add_trace(
-        go.Scatter(
-            y=mix_data["Harm_drop_rate"],
-            x=mix_data["year"],
-            name="Array Drop Rate",
-            mode='markers',  # Show markers with text labels
-            text=array_data['Study'],  # Show study names
-            textposition='top center',  # Position text labels
-            marker=dict(
-                size=8,  # Size of markers
-                color=array_data["Harm_drop_rate"], 
-                colorscale='Viridis',  # Color scale
-                #showscale=True  # Show color scale
+def patch_drop_rate_panel(patched, trace, col, panel):
+    """
+    Write one panel's trace arrays into a drop-rate figure Patch
+    """
+    patched['data'][trace]['type'] = panel['type']
+    patched['data'][trace]['x'] = panel['x']
+    patched['data'][trace]['y'] = panel['y']
+    patched['data'][trace]['text'] = panel['text']
+    patched['data'][trace]['marker']['color'] = panel['color']
+    patched['data'][trace]['marker']['size'] = panel['size']
+    axis = 'xaxis' if col == 1 else f'xaxis{col}'
+    patched['layout'][axis]['tickvals'] = panel['tickvals']
+    patched['layout'][axis]['ticktext'] = panel['ticktext']
+
+def drop_rate_panels_with_data(results):
+    return [name for name, _, _ in drop_rate_panels if name in results and not results[name].empty]
+
+def build_drop_rate_figure(results):
+    # Dropping Rate Plot by year
+    # Fig3.1: For Array data
+    # Fig 3.2: For sequencing data
+    # Fig 3.3: For combined data
+    fig3 = subplots.make_subplots(rows=1, cols=3, subplot_titles=[title for _, title, _ in drop_rate_panels])
+
+    axes = {}
+    for col, (name, title, threshold) in enumerate(drop_rate_panels, start=1):
+        data = results.get(name)
+        if data is None or data.empty:
+            continue  # Leave the panel empty if its endpoint failed
+
+        panel = drop_rate_panel_data(data)
+        scatter = go.Scattergl if panel['type'] == 'scattergl' else go.Scatter  # WebGL for large panels
+
+        fig3.add_trace(
+            scatter(
+                y=panel["y"],
+                x=panel["x"],
+                name=title,
+                mode='markers',  # Show markers with text labels
+                text=panel['text'],  # Show study names (or bin counts)
+                marker=dict(
+                    size=panel['size'],  # Size of markers
+                    color=panel["color"], 
+                    colorscale='Viridis',  # Color scale
+                    #showscale=True  # Show color scale
+                    ),
                 ),
-            ),
-        row=1, col=3
-    )
+            row=1, col=col
+        )
+
+        if threshold is not None:
+            fig3.add_hline(
+                y=threshold,  # 0.2 corresponds to 20%
+                line=dict(
+                    color='red',  # Color of the line
+                    width=2,  # Line width
+                    dash='dash'  # Line style, e.g., 'dash', 'dot', 'solid'
+                    ),
+                    row=1, col=col
+                    )
+
+        axes['xaxis' if col == 1 else f'xaxis{col}'] = dict(
+            tickmode='array',  # Use an array for tick values
+            tickvals=panel['tickvals'],  # Set the tick positions to unique years
+            ticktext=panel['ticktext'],  # Use year as text labels
+            title="Year"
+        )
 
     fig3.update_yaxes(
     tickformat='.2%'
     )
 
     fig3.update_layout(
-        title_text="Harmonisation Drop Rate Plots (Past 10 Years) with dropping rate > 0.15", 
+        title_text=drop_rate_title(), 
         showlegend=False,
-        xaxis = dict(
-            tickmode='array',  # Use an array for tick values
-            tickvals=array_data['year'].dropna().unique(),  # Set the tick positions to unique years
-            ticktext=[str(year) for year in array_data['year'].dropna().unique()],  # Use year as text labels
-            title="Year"
-        ),  # Rotate x-axis labels for better readability
-        xaxis2 = dict(
-            tickmode='array',  # Use an array for tick values
-            tickvals=sequencing_data['year'].dropna().unique(),  # Set the tick positions to unique years
-            ticktext=[str(year) for year in sequencing_data['year'].dropna().unique()],  # Use year as text labels
-            title="Year"
-        ),
-        xaxis3 = dict(
-            tickmode='array',  # Use an array for tick values
-            tickvals=mix_data['year'].dropna().unique(),  # Set the tick positions to unique years
-            ticktext=[str(year) for year in mix_data['year'].dropna().unique()],  # Use year as text labels
-            title="Year"
-        ),
+        **axes
+    )
+    return fig3
+
+@refresher.register
+def warm_figures():
+    """
+    Background refresh: re-fetch the summary endpoints and pre-build the figures
+    """
+    results, versions, errors = fetch_plot_data(refresh=True)
+    if 'status' in results and not results['status'].empty:
+        cached_figure(('status', versions['status']), lambda: build_status_figure(results['status']))
+    if 'newly_harmonised' in results and not results['newly_harmonised'].empty:
+        cached_figure(
+            ('newly_harmonised', versions['newly_harmonised']),
+            lambda: build_newly_harmonised_figure(results['newly_harmonised'])
+        )
+    cached_figure(drop_rate_key(versions), lambda: build_drop_rate_figure(results))
+
+# Create callback to load the data and generate the plot
+@callback(
+    Output("Status-Distribution-plot", "figure"),
+    Output("Newly-harmonised-plot", "figure"),
+    Output("Dropping-rate-plot", "figure"),
+    Output("plot-error-message", "children"),
+    Output("plot-data-version", "data"),
+    Input("Status-Distribution-plot", "id"),
+    background=background.enabled,  # Off the request worker when configured
+    manager=background.manager
+)
+def update_plots(_):
+    results, versions, errors = fetch_plot_data()
+
+    # Status Distribution Plot
+    if 'status' in results and not results['status'].empty:
+        fig1 = cached_figure(('status', versions['status']), lambda: build_status_figure(results['status']))
+    else:
+        fig1 = empty_figure('Current Harmonisation Status')
+
+    # Newly Harmonised Plot 
+    if 'newly_harmonised' in results and not results['newly_harmonised'].empty:
+        fig2 = cached_figure(
+            ('newly_harmonised', versions['newly_harmonised']),
+            lambda: build_newly_harmonised_figure(results['newly_harmonised'])
+        )
+    else:
+        fig2 = empty_figure(newly_harmonised_title())
+
+    fig3 = cached_figure(drop_rate_key(versions), lambda: build_drop_rate_figure(results))
+
+    error_message = [html.P(message, style={'color': 'red'}) for message in errors.values()]
+    plot_state = {'versions': versions, 'panels': drop_rate_panels_with_data(results)}
+    return fig1,fig2,fig3,error_message,plot_state
+
+# Poll the endpoints and patch only the figures whose data changed
+@callback(
+    Output("Status-Distribution-plot", "figure", allow_duplicate=True),
+    Output("Newly-harmonised-plot", "figure", allow_duplicate=True),
+    Output("Dropping-rate-plot", "figure", allow_duplicate=True),
+    Output("plot-error-message", "children", allow_duplicate=True),
+    Output("plot-data-version", "data", allow_duplicate=True),
+    Input("interval-update", "n_intervals"),
+    State("plot-data-version", "data"),
+    prevent_initial_call=True
+)
+def refresh_plots(n_intervals, plot_state):
+    if not plot_state:
+        raise PreventUpdate
+
+    # Conditional requests to the backend; unchanged routes cost a 304
+    results, versions, errors = fetch_plot_data(max_age=REFRESH_SECONDS)
+    old_versions = plot_state['versions']
+    changed = {name for name, version in versions.items() if old_versions.get(name) != version}
+    if not changed and not errors and set(versions) == set(old_versions):
+        raise PreventUpdate
+
+    # Status bars are coloured per status, so rebuild when counts change
+    fig1 = no_update
+    if 'status' in changed and not results['status'].empty:
+        fig1 = cached_figure(('status', versions['status']), lambda: build_status_figure(results['status']))
+
+    # Newly harmonised: a single bar trace, patched in place
+    fig2 = no_update
+    if 'newly_harmonised' in changed and not results['newly_harmonised'].empty:
+        newly_harmonised = results['newly_harmonised']
+        if 'newly_harmonised' in old_versions:
+            fig2 = Patch()
+            fig2['data'][0]['x'] = newly_harmonised['month'].tolist()
+            fig2['data'][0]['y'] = newly_harmonised['num_studies'].tolist()
+            fig2['data'][0]['text'] = newly_harmonised['num_studies'].tolist()
+        else:
+            fig2 = cached_figure(
+                ('newly_harmonised', versions['newly_harmonised']),
+                lambda: build_newly_harmonised_figure(newly_harmonised)
+            )
+
+    # Drop rates: patch the traces of the panels that changed, rebuild if a
+    # panel appeared or disappeared
+    fig3 = no_update
+    panels = drop_rate_panels_with_data(results)
+    if any(name in changed for name, _, _ in drop_rate_panels) or panels != plot_state['panels']:
+        if panels == plot_state['panels']:
+            fig3 = Patch()
+            for trace, name in enumerate(panels):
+                if name not in changed:
+                    continue
+                col = [panel_name for panel_name, _, _ in drop_rate_panels].index(name) + 1
+                patch_drop_rate_panel(fig3, trace, col, drop_rate_panel_data(results[name]))
+        else:
+            fig3 = cached_figure(drop_rate_key(versions), lambda: build_drop_rate_figure(results))
+
+    # Keep the last good version of routes that failed this time
+    versions = {**{name: old_versions[name] for name in errors if name in old_versions}, **versions}
+    error_message = [html.P(message, style={'color': 'red'}) for message in errors.values()]
+    return fig1,fig2,fig3,error_message,{'versions': versions, 'panels': panels if fig3 is not no_update else plot_state['panels']}
+
+def visible_year_ranges(relayout_data):
+    """
+    {subplot column: (first year, last year) or None for autorange} from a
+    relayoutData event of the drop-rate figure
+    """
+    ranges = {}
+    for col in range(1, len(drop_rate_panels) + 1):
+        axis = 'xaxis' if col == 1 else f'xaxis{col}'
+        if relayout_data.get(f'{axis}.autorange'):
+            ranges[col] = None
+        elif f'{axis}.range[0]' in relayout_data:
+            ranges[col] = (relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]'])
+        elif f'{axis}.range' in relayout_data:
+            ranges[col] = tuple(relayout_data[f'{axis}.range'])
+    return ranges
+
+# On zoom, send full-resolution points of the visible years of large panels
+@callback(
+    Output("Dropping-rate-plot", "figure", allow_duplicate=True),
+    Input("Dropping-rate-plot", "relayoutData"),
+    State("plot-data-version", "data"),
+    prevent_initial_call=True
+)
+def zoom_drop_rate(relayout_data, plot_state):
+    if not relayout_data or not plot_state:
+        raise PreventUpdate
+    ranges = visible_year_ranges(relayout_data)
+    if not ranges:
+        raise PreventUpdate
+
+    results, versions, errors = fetch_plot_data()
+    patched = Patch()
+    updated = False
+    for col, year_range in ranges.items():
+        name = drop_rate_panels[col - 1][0]
+        data = results.get(name)
+        if name not in plot_state['panels'] or data is None or len(data) <= DENSITY_POINTS:
+            continue  # Small panels already show every study
+        if year_range is not None:
+            year_range = (int(np.ceil(year_range[0])), int(np.floor(year_range[1])))
+        trace = plot_state['panels'].index(name)
+        patch_drop_rate_panel(patched, trace, col, drop_rate_panel_data(data, year_range))
+        updated = True
+
+    if not updated:
+        raise PreventUpdate
+    return patched
+
+def build_trend_figure(trend, now):
+    """
+    Status counts over time as step lines, held until now
+    """
+    # Extend each status's last count to now
+    latest = trend[trend['time'] == trend['time'].max()].assign(time=pd.Timestamp(now, unit='s'))
+    fig = px.line(
+        pd.concat([trend, latest]),
+        x='time',
+        y='num_unique_studies',
+        color='Harm_status',
+        line_shape='hv',
+        title='Harmonisation Status Over Time',
+        labels={'time': 'Date', 'num_unique_studies': 'Count', 'Harm_status': 'Status'}
     )
+    return fig
+
+# Status trend, queried from the local history store (no backend requests)
+def update_status_trend(days, n_intervals, revision):
+    # Redraw when the range changes or a new version was recorded
+    current = {'revision': history.revision(), 'days': days}
+    if current == revision:
+        raise PreventUpdate
+
+    now = datetime.now().timestamp()
+    trend = history.status_history(start=now - days * 86400 if days else None)
+    if trend.empty:
+        return empty_figure('Harmonisation Status Over Time'), current
+    return build_trend_figure(trend, now), current
+
+def build_drop_rate_trend_figure(trend, now):
+    """
+    Drop rates of the chosen studies over time as step lines, held until now
+    """
+    latest = trend.groupby('Study').tail(1).assign(time=pd.Timestamp(now, unit='s'))
+    fig = px.line(
+        pd.concat([trend, latest]).sort_values(['Study', 'time']),
+        x='time',
+        y='Harm_drop_rate',
+        color='Study',
+        line_shape='hv',
+        markers=True,
+        title='Drop Rate Over Time',
+        labels={'time': 'Date', 'Harm_drop_rate': 'Drop Rate'}
+    )
+    return fig
+
+# Drop rate history of the studies entered above the plot
+def update_drop_rate_trend(studies_text, days, n_intervals, revision):
+    studies = sorted({study.strip() for study in (studies_text or '').split(',') if study.strip()})
+    current = {'revision': history.revision(), 'days': days, 'studies': studies}
+    if current == revision:
+        raise PreventUpdate
+    if not studies:
+        return empty_figure('Drop Rate Over Time: enter study accessions'), current
+
+    now = datetime.now().timestamp()
+    trend = history.drop_rate_history(studies, start=now - days * 86400 if days else None)
+    if trend.empty:
+        return empty_figure('Drop Rate Over Time'), current
+    return build_drop_rate_trend_figure(trend, now), current
 
-    return fig1,fig2,fig3,""
\ No newline at end of file
+# The trend components are only in the layout when the history store is
+# enabled, so their callbacks are only registered then
+if history.enabled:
+    callback(
+        Output("Status-trend-plot", "figure"),
+        Output("trend-revision", "data"),
+        Input("trend-range", "value"),
+        Input("interval-update", "n_intervals"),
+        State("trend-revision", "data")
+    )(update_status_trend)
+    callback(
+        Output("Drop-rate-trend-plot", "figure"),
+        Output("drop-rate-trend-revision", "data"),
+        Input("trend-studies", "value"),
+        Input("trend-range", "value"),
+        Input("interval-update", "n_intervals"),
+        State("drop-rate-trend-revision", "data")
+    )(update_drop_rate_trend)
@@ -1,207 +1,261 @@
 # pages/table.py
 import dash
-from dash import html, dash_table, callback, Input, Output, State, dcc, ALL
-import pandas as pd
+from dash import html, dash_table, callback, clientside_callback, Input, Output, State, dcc, ALL, Patch, no_update
 from dash.exceptions import PreventUpdate
-import dash_mantine_components as dmc
-import re
-import requests
+import dash_mantine_components as dmc  # Imported eagerly so Dash serves its scripts
+import os
+
+from utils import background, dataset, export, export_jobs, schema, facets, metrics, refresher, search, study_db, filter_query as filter_compiler
 
 # Register this file as a page
 dash.register_page(__name__, path="/", title="Table View")
 
-def get_data(): 
-    try:
-        response = requests.get("http://127.0.0.1:8000/")
-        return response.json()
-    except requests.exceptions.RequestException:
-        return []
-
-# Define the layout of the table page
-layout = dmc.MantineProvider([
-    html.H1("GWAS Catalog summary statistic harmonisation status"),
+# Seconds between live-refresh polls of the backend
+LIVE_REFRESH_SECONDS = float(os.environ.get('HARMSTATUS_LIVE_REFRESH_SECONDS', 5))
+
+# Columns shown before any are picked in the column selector; only the
+# displayed columns are sent to the browser
+initial_columns = ["Study", "PMID", "Genotyping_type",
+                   "Effect_size_type", "Raw_N_variants",
+                   "Harm_status", "Latest_harm_start_date",
+                   "Harm_drop_rate", "Liftover_drop_rate"]
+
+@refresher.register
+def warm_table():
+    """
+    Background refresh: re-fetch the study list and build its facet and search indexes
+    """
+    version = dataset.load_dataset(refresh=True)
+    if version:
+        facets.get_facets(version)
+        search.get_search_index(version)
+
+# Define the layout of the table page, built on request rather than at import
+def layout(**kwargs):
+    return dmc.MantineProvider([
+        html.H1("GWAS Catalog summary statistic harmonisation status"),
     
-    # Container for filter dropdowns
-    html.Div(id='filter-container', className='filter-container'),
+        # Container for filter dropdowns
+        html.Div(id='filter-container', className='filter-container'),
     
-    html.Div([
-    # Flex container with space-between to push popover and download to the right
-    html.Div([
-        # Left-side buttons container
         html.Div([
-            # Apply filters button
-            dmc.Button(
-                'Apply Filters', 
-                id='apply-filters-button', 
-                n_clicks=0,
-                variant="outline",
-                style={'marginRight': '10px'}
-            ),
-            
-            # Clear filters button
-            dmc.Button(
-                'Clear Filters', 
-                id='clear-filters-button', 
-                n_clicks=0,
-                variant="outline"
-            )
-        ], style={
-            'display': 'flex',
-            'alignItems': 'center'
-        }),
-        
-        # Right-side container for popover and download
+        # Flex container with space-between to push popover and download to the right
         html.Div([
-            # Popover with column selector
-            dmc.Popover(
-                width=300,
-                position="bottom",
-                withArrow=True,
-                shadow="md",
-                children=[
-                    dmc.PopoverTarget(
-                        dmc.Button(
-                            "Select columns to display", 
-                            variant="outline",
-                            style={'marginRight': '10px'}
-                        )
-                    ),
-                    dmc.PopoverDropdown(
-                        dmc.MultiSelect(
-                            id="column-selector",
-                            label="Select columns to display",
-                            placeholder="Pick columns",
-                            data=[],
-                            comboboxProps={"withinPortal": False},
-                        )
-                    ),
-                ],
-            ),
-            dmc.Button(
-                "Update Table",
-                id="update-table-button",
-                n_clicks=0,
-                variant="outline",
-                style={'marginLeft': '10px'}
+            # Left-side buttons container
+            html.Div([
+                # Apply filters button
+                dmc.Button(
+                    'Apply Filters', 
+                    id='apply-filters-button', 
+                    n_clicks=0,
+                    variant="outline",
+                    style={'marginRight': '10px'}
                 ),
             
-            # Download button
-            dcc.Download(id='download-tsv-component'),
-            dmc.Button(
-                'Download TSV', 
-                id='download-tsv-button', 
-                n_clicks=0,
-                variant="outline"
-            )
-        ], style={
-            'display': 'flex',
-            'alignItems': 'center'
-            })
-        ], style={
-            'display': 'flex',  # Use flexbox 
-            'justifyContent': 'space-between',  # Push right-side content to the right
-            'alignItems': 'center',  # Vertically center the items
-            'width': '100%'  # Full width
-            })
-        ], style={
-            'width': '100%',  # Full width container
-            'padding': '10px'  # Optional padding
+                # Clear filters button
+                dmc.Button(
+                    'Clear Filters', 
+                    id='clear-filters-button', 
+                    n_clicks=0,
+                    variant="outline"
+                ),
+
+                # Live refresh toggle: poll the backend and patch changed rows
+                dmc.Switch(
+                    id='live-refresh-switch',
+                    label='Live refresh',
+                    checked=False,
+                    style={'marginLeft': '10px'}
+                ),
+                dcc.Interval(
+                    id='table-interval-update',
+                    interval=LIVE_REFRESH_SECONDS * 1000,
+                    n_intervals=0,
+                    disabled=True
+                )
+            ], style={
+                'display': 'flex',
+                'alignItems': 'center'
             }),
+        
+            # Right-side container for popover and download
+            html.Div([
+                # Popover with column selector
+                dmc.Popover(
+                    width=300,
+                    position="bottom",
+                    withArrow=True,
+                    shadow="md",
+                    children=[
+                        dmc.PopoverTarget(
+                            dmc.Button(
+                                "Select columns to display", 
+                                variant="outline",
+                                style={'marginRight': '10px'}
+                            )
+                        ),
+                        dmc.PopoverDropdown(
+                            dmc.MultiSelect(
+                                id="column-selector",
+                                label="Select columns to display",
+                                placeholder="Pick columns",
+                                data=[],
+                                comboboxProps={"withinPortal": False},
+                            )
+                        ),
+                    ],
+                ),
+                dmc.Button(
+                    "Update Table",
+                    id="update-table-button",
+                    n_clicks=0,
+                    variant="outline",
+                    style={'marginLeft': '10px'}
+                    ),
+            
+                # Download button: TSV streams from the /export/tsv/<key> route, the
+                # other formats are built by a background export job
+                dcc.Location(id='download-location', refresh=True),
+                dmc.Select(
+                    id='download-format',
+                    data=[{'label': 'TSV', 'value': 'tsv'}] + [
+                        {'label': export_jobs.formats[name]['label'], 'value': name}
+                        for name in export_jobs.available_formats()
+                    ],
+                    value='tsv',
+                    allowDeselect=False,
+                    w=140,
+                    style={'marginRight': '10px'}
+                ),
+                dmc.Button(
+                    'Download', 
+                    id='download-tsv-button', 
+                    n_clicks=0,
+                    variant="outline"
+                ),
+                # Progress of the running export job
+                dcc.Store(id='export-job'),
+                dcc.Interval(id='export-interval', interval=1000, disabled=True),
+                html.Div([
+                    dmc.Progress(id='export-progress', value=0, w=120),
+                    html.Span(id='export-status', style={'marginLeft': '10px'})
+                ], id='export-progress-container', style={'display': 'none', 'alignItems': 'center', 'marginLeft': '10px'})
+            ], style={
+                'display': 'flex',
+                'alignItems': 'center'
+                })
+            ], style={
+                'display': 'flex',  # Use flexbox 
+                'justifyContent': 'space-between',  # Push right-side content to the right
+                'alignItems': 'center',  # Vertically center the items
+                'width': '100%'  # Full width
+                })
+            ], style={
+                'width': '100%',  # Full width container
+                'padding': '10px'  # Optional padding
+                }),
 
-    # Main data table
-    dash_table.DataTable(
-        id='harmonised-studies',
-        columns=[],
-        data=[],
-        editable=False,
-        filter_action="native",  # Keep native filtering enabled
-        sort_action="native",
-        sort_mode="multi",
-        row_selectable="multi",
-        row_deletable=False,
-        selected_rows=[],
-        selected_columns=[],
-        page_action="native",
-        page_current=0,
-        page_size=10,
-        style_table={'height': 500, 'overflowY': 'auto', 'overflowX': 'auto'},
-        style_cell={
-            'height': 'auto',
-            # all three widths are needed
-            'minWidth': '100px',
-            'maxWidth': '200px',
-            'whiteSpace': 'normal',
-            'overflowWrap': 'break-word'
-            },
-        style_data={
-        'color': 'black',
-        'backgroundColor': 'white',
-        'whiteSpace': 'normal',
-        'height': 'auto',
-        },
-        style_data_conditional=[
-            {
-                'if': {'row_index': 'odd'},
-                'backgroundColor': 'rgb(220, 220, 220)',
-                }
-                ],
-        style_header={
-            'backgroundColor': 'rgb(210, 210, 210)',
+        # Main data table
+        dash_table.DataTable(
+            id='harmonised-studies',
+            columns=[],
+            data=[],
+            editable=False,
+            filter_action="custom",  # Filtering, sorting and paging run on the server
+            filter_query='',
+            sort_action="custom",
+            sort_mode="multi",
+            row_selectable="multi",
+            row_deletable=False,
+            selected_rows=[],
+            selected_columns=[],
+            sort_by=[],
+            page_action="custom",
+            page_current=0,
+            page_size=10,
+            style_table={'height': 500, 'overflowY': 'auto', 'overflowX': 'auto'},
+            style_cell={
+                'height': 'auto',
+                # all three widths are needed
+                'minWidth': '100px',
+                'maxWidth': '200px',
+                'whiteSpace': 'normal',
+                'overflowWrap': 'break-word'
+                },
+            style_data={
             'color': 'black',
-            'fontWeight': 'bold',
+            'backgroundColor': 'white',
             'whiteSpace': 'normal',
             'height': 'auto',
-            'textAlign': 'center'
-            }
-        ),
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(220, 220, 220)',
+                    }
+                    ],
+            style_header={
+                'backgroundColor': 'rgb(210, 210, 210)',
+                'color': 'black',
+                'fontWeight': 'bold',
+                'whiteSpace': 'normal',
+                'height': 'auto',
+                'textAlign': 'center'
+                }
+            ),
     
-    html.Br(),
-    dcc.Checklist(
-        id='datatable-use-page-count',
-        options=[
-            {'label': 'Use page_count', 'value': 'True'}
-        ],
-        value=['True']
-    ),
-    'Page count: ',
-    dcc.Input(
-        id='datatable-page-count',
-        type='number',
-        min=1,
-        max=29,
-        value=20
-    ),
-    html.Div(id='datatable-interactivity-container'),
+        html.Br(),
+        dcc.Checklist(
+            id='datatable-use-page-count',
+            options=[
+                {'label': 'Use page_count', 'value': 'True'}
+            ],
+            value=['True']
+        ),
+        'Page count: ',
+        dcc.Input(
+            id='datatable-page-count',
+            type='number',
+            min=1,
+            max=29,
+            value=20
+        ),
+        html.Div(id='datatable-interactivity-container'),
     
-    # Store component to hold the data
-    dcc.Store(id='table-data-store')
-])
+        # Store component to hold the dataset version key (the data stays on the server)
+        dcc.Store(id='table-data-store'),
+        # Row ids selected across all pages
+        dcc.Store(id='table-selected-ids', data=[]),
+        # Dataset version picked up by the live refresh, if newer than table-data-store
+        dcc.Store(id='table-live-version')
+    ])
 
 # Load data and update stores
 
 @callback(
      Output('table-data-store', 'data'),
      Output('column-selector', 'data'),
-     Output('column-selector', 'value'),  # Default: Select all columns
-     Input('harmonised-studies', 'id')
+     Output('column-selector', 'value'),  # Default: the initially displayed columns
+     Input('harmonised-studies', 'id'),
+     background=background.enabled,  # Off the request worker when configured
+     manager=background.manager
  )
 def load_data(data):
-    data = get_data()
-    if not data:
-        return [], [], []
+    version = dataset.load_dataset()
+    if not version:
+        return None, [], []
 
-    df = pd.DataFrame(data)
+    df = dataset.get_dataset(version)
 
     # Prepare the column options for the MultiSelect component
     column_options = [{"label": col, "value": col} for col in df.columns]
     
-    # Return data, column options, and default selection (all columns)
-    return data, column_options, df.columns.tolist() # Default: all selected
+    # Return version, column options, and default selection (displayed columns)
+    return version, column_options, [col for col in initial_columns if col in df.columns]
 
-# load the table data
+# load the table columns
 @callback(
     Output('harmonised-studies', 'columns'),
-    Output('harmonised-studies', 'data'),
     Input('table-data-store', 'data'),
     prevent_initial_call=True  # Allow the callback to trigger on page load
 )
@@ -209,87 +263,207 @@ def update_selected_table(data):
     if not data:
         raise PreventUpdate
 
-    df = pd.DataFrame(data)
-
-    initial_columns=["Study","PMID","Genotyping_type", 
-                    "Effect_size_type","Raw_N_variants",
-                    "Harm_status","Latest_harm_start_date",
-                    "Harm_drop_rate","Liftover_drop_rate"]
     columns = [{"name": col, "id": col} for col in initial_columns]  # Only include selected columns
-    table_data = df.to_dict('records')
 
-    return columns, table_data
+    return columns
 
-# Update the columns based on selection (hidden unwanted columns)
+# Serve the current page of the table (custom paging, filtering and sorting)
 @callback(
-    Output('harmonised-studies', 'hidden_columns'),
-    Input('update-table-button', 'n_clicks'),
+    Output('harmonised-studies', 'data'),
+    Output('harmonised-studies', 'page_count'),
+    Output('harmonised-studies', 'selected_rows'),
+    Input('table-data-store', 'data'),
+    Input('harmonised-studies', 'page_current'),
+    Input('harmonised-studies', 'page_size'),
+    Input('harmonised-studies', 'sort_by'),
+    Input('harmonised-studies', 'filter_query'),
+    Input('harmonised-studies', 'columns'),  # Picking more columns fetches them
+    State('table-selected-ids', 'data'),
+    State('table-live-version', 'data'),
+    prevent_initial_call=True
+)
+def update_table_page(version, page_current, page_size, sort_by, filter_query, columns, selected_ids, live_version):
+    if not version:
+        raise PreventUpdate
+
+    with metrics.timed(metrics.stage_seconds, stage='table_page'):
+        return build_table_page(
+            live_version or version, page_current, page_size, sort_by, filter_query, selected_ids, columns
+        )
+
+def build_table_page(version, page_current, page_size, sort_by, filter_query, selected_ids, columns=None):
+    """
+    Filter, sort and slice the study table into (page rows, page count, selected
+    rows). Rows hold only the displayed columns (all columns if None)
+    """
+    visible = [col['id'] for col in columns] if columns else None
+    try:
+        if study_db.enabled and study_db.current_version() == version:
+            # Indexed SQL query on the materialized snapshot
+            page, total = study_db.query_page(filter_query, sort_by, page_current, page_size, visible)
+        else:
+            version, df = dataset.resolve_dataset(version)
+            if df.empty:
+                raise PreventUpdate
+            df = dataset.sort_table(filter_compiler.apply(df, filter_query, search.index_for_query(version, filter_query)), sort_by)
+            total = len(df)
+            start = min(page_current, max(1, -(-total // page_size)) - 1) * page_size
+            page = df.iloc[start: start + page_size]
+            if visible is not None:
+                page = page[[col for col in visible if col in page.columns]]
+    except filter_compiler.FilterQueryError:
+        raise PreventUpdate  # Keep the current page while the query is incomplete
+
+    page_count = max(1, -(-total // page_size))
+    table_data = schema.with_text_dates(page).assign(id=page.index).to_dict('records')  # Row ids keep selections across pages
+
+    # Re-select the rows of this page that were selected earlier
+    selected_ids = set(selected_ids or [])
+    selected_rows = [i for i, row_id in enumerate(page.index) if row_id in selected_ids]
+
+    return table_data, page_count, selected_rows
+
+# Remember selected rows across pages (in the browser, no server round trip)
+clientside_callback(
+    """
+    function(selected_row_ids, page_data, selected_ids) {
+        // Replace the selection of this page, keep the other pages'
+        const pageIds = new Set((page_data || []).map(row => row.id));
+        const ids = new Set((selected_ids || []).filter(id => !pageIds.has(id)));
+        (selected_row_ids || []).forEach(id => ids.add(id));
+        return Array.from(ids).sort((a, b) => a - b);
+    }
+    """,
+    Output('table-selected-ids', 'data'),
+    Input('harmonised-studies', 'selected_row_ids'),
+    State('harmonised-studies', 'data'),
+    State('table-selected-ids', 'data'),
+    prevent_initial_call=True
+)
+
+# Turn live refresh on and off
+clientside_callback(
+    """
+    function(checked) {
+        return !checked;
+    }
+    """,
+    Output('table-interval-update', 'disabled'),
+    Input('live-refresh-switch', 'checked')
+)
+
+# Live refresh: pick up a new dataset version and patch only the changed rows
+@callback(
+    Output('harmonised-studies', 'data', allow_duplicate=True),
+    Output('harmonised-studies', 'page_count', allow_duplicate=True),
+    Output('harmonised-studies', 'selected_rows', allow_duplicate=True),
+    Output('table-live-version', 'data'),
+    Input('table-interval-update', 'n_intervals'),
     State('table-data-store', 'data'),
-    State('column-selector', 'value'),
-    prevent_initial_call=True  # Allow the callback to trigger on page load
+    State('table-live-version', 'data'),
+    State('harmonised-studies', 'data'),
+    State('harmonised-studies', 'page_current'),
+    State('harmonised-studies', 'page_size'),
+    State('harmonised-studies', 'sort_by'),
+    State('harmonised-studies', 'filter_query'),
+    State('table-selected-ids', 'data'),
+    State('harmonised-studies', 'columns'),
+    prevent_initial_call=True
 )
-def update_table_columns(n_clicks, data, selected_columns):
-    
-    if not data:
+def refresh_table(
+    n_intervals, version, live_version, page_data, page_current, page_size, sort_by, filter_query, selected_ids, columns
+):
+    current_version = live_version or version
+    if not current_version:
         raise PreventUpdate
 
-    df = pd.DataFrame(data)
+    # Conditional request to the backend; unchanged data costs a 304
+    new_version = dataset.load_dataset(max_age=LIVE_REFRESH_SECONDS)
+    if not new_version or new_version == current_version:
+        raise PreventUpdate
+
+    delta = dataset.diff_datasets(current_version, new_version)
+    if delta is not None:
+        changed_rows, changed_columns = delta
+
+        # Rows can only be patched in place if the change cannot move them
+        # in or out of the filter, or reorder the page
+        sorted_columns = {col['column_id'] for col in sort_by or []}
+        affects_page = any(
+            '{' + col + '}' in (filter_query or '') or col in sorted_columns
+            for col in changed_columns
+        )
+        if not affects_page:
+            visible = [col['id'] for col in columns or [] if col['id'] in changed_rows.columns]
+            patched = Patch()
+            for i, row in enumerate(page_data or []):
+                if row['id'] in changed_rows.index:
+                    changed_row = schema.with_text_dates(changed_rows.loc[[row['id']], visible])
+                    patched[i] = changed_row.assign(id=row['id']).to_dict('records')[0]
+            return patched, no_update, no_update, new_version
+
+    # Otherwise resend the current page of the new version
+    table_data, page_count, selected_rows = build_table_page(
+        new_version, page_current, page_size, sort_by, filter_query, selected_ids, columns
+    )
+    return table_data, page_count, selected_rows, new_version
 
-    column_not_show=list(set(df.columns) - set(selected_columns))
-    return column_not_show
+# Display the selected columns; the page callback then fetches their values.
+# Runs in the browser from the column options loaded with the data
+clientside_callback(
+    """
+    function(n_clicks, column_options, selected_columns) {
+        if (!n_clicks || !column_options || !column_options.length) {
+            return window.dash_clientside.no_update;
+        }
+        // Keep the table's column order
+        const selected = new Set(selected_columns || []);
+        return column_options
+            .filter(option => selected.has(option.value))
+            .map(option => ({name: option.value, id: option.value}));
+    }
+    """,
+    Output('harmonised-studies', 'columns', allow_duplicate=True),
+    Input('update-table-button', 'n_clicks'),
+    State('column-selector', 'data'),
+    State('column-selector', 'value'),
+    prevent_initial_call=True
+)
 
 # Create filter dropdowns for each column
 @callback(
     Output('filter-container', 'children'),
     Input('table-data-store', 'data')
 )
-def create_filter_dropdowns(data):
+def create_filter_dropdowns(version):
     """
     Create dynamic filter dropdowns based on column characteristics
     """
-    if not data:
+    if not version:
         raise PreventUpdate
     
-    df = pd.DataFrame(data)
+    # Options and counts come from the facet index built once per version
+    facet_index = facets.get_facets(version)
     filter_elements = []
     
-    # Define special handling for specific column types
-    text_input_columns = ['PMID', 'First_author']
-    comparison_columns = [
-        'Raw_N_variants', 
-        'Harm_drop_rate', 
-        'Liftover_drop_rate'
-    ]
-    dropdown_columns = [
-        'Effect_size_type',
-        'Raw_genome_build',
-        'Raw_coordinate_system',
-        'Harm_status',
-        'Harm_account', 
-        'Harm_exitcode', 
-        'Harm_failstep'
-    ]
-    
-    # Dropdown columns (categorical selection)
-    for col in dropdown_columns:
-        unique_values = df[col].dropna().unique()
-        
-        # Only create dropdowns for columns with a reasonable number of unique values
-        if len(unique_values) <= 20:  # Increased limit to 20
-            filter_elements.append(
-                html.Div([
-                    html.Label(f"Filter by {col}:"),
-                    dcc.Dropdown(
-                        id={'type': 'filter-dropdown', 'column': col},
-                        options=[{'label': str(val), 'value': str(val)} for val in sorted(unique_values)],
-                        multi=True,
-                        placeholder=f"Select {col} values"
-                    )
-                ], style={'width': '250px', 'display': 'inline-block', 'margin': '10px'})
-            )
+    # Dropdown columns (categorical selection), labelled with row counts
+    for col in facets.dropdown_columns:
+        if col not in facet_index.codes:
+            continue
+        filter_elements.append(
+            html.Div([
+                html.Label(f"Filter by {col}:"),
+                dcc.Dropdown(
+                    id={'type': 'filter-dropdown', 'column': col},
+                    options=facet_index.options(col),
+                    multi=True,
+                    placeholder=f"Select {col} values"
+                )
+            ], style={'width': '250px', 'display': 'inline-block', 'margin': '10px'})
+        )
 
     # Text input columns (free text search)
-    for col in text_input_columns:
+    for col in facets.text_input_columns:
         filter_elements.append(
             html.Div([
                 dmc.TextInput(
@@ -302,10 +476,15 @@ def create_filter_dropdowns(data):
         )
 
     # Comparison columns (numeric comparison)
-    for col in comparison_columns:
+    for col in facets.comparison_columns:
+        # Show the value range of the column next to its name
+        label = f"Filter {col}:"
+        if col in facet_index.ranges:
+            low, high = facet_index.ranges[col]
+            label = f"Filter {col} ({low:g} to {high:g}):"
         filter_elements.append(
             html.Div([
-                html.Label(f"Filter {col}:"),
+                html.Label(label),
                 html.Div([
                     dcc.Dropdown(
                         id={'type': 'comparison-operator', 'column': col},
@@ -329,9 +508,53 @@ def create_filter_dropdowns(data):
 
     return filter_elements
 
+# Update the dropdown counts as other filters are chosen
+@callback(
+    Output({'type': 'filter-dropdown', 'column': ALL}, 'options'),
+    Input({'type': 'filter-dropdown', 'column': ALL}, 'value'),
+    Input({'type': 'comparison-operator', 'column': ALL}, 'value'),
+    Input({'type': 'comparison-value', 'column': ALL}, 'value'),
+    State({'type': 'filter-dropdown', 'column': ALL}, 'id'),
+    State({'type': 'comparison-operator', 'column': ALL}, 'id'),
+    State('table-data-store', 'data'),
+    prevent_initial_call=True
+)
+def update_facet_counts(dropdown_values, comparison_operators, comparison_values, dropdown_ids, comparison_ids, version):
+    if not version or not dropdown_ids:
+        raise PreventUpdate
+
+    facet_index = facets.get_facets(version)
+    selections = {
+        dropdown_id['column']: values
+        for dropdown_id, values in zip(dropdown_ids, dropdown_values) if values
+    }
+    comparisons = {
+        comparison_id['column']: (operator, value)
+        for comparison_id, operator, value in zip(comparison_ids, comparison_operators, comparison_values)
+        if operator and value is not None
+    }
+
+    # Each dropdown counts rows matching every filter except its own
+    columns = [dropdown_id['column'] for dropdown_id in dropdown_ids]
+    if study_db.enabled and study_db.current_version() == version:
+        # Indexed GROUP BY on the materialized snapshot
+        options = []
+        for col in columns:
+            counts = study_db.facet_counts(col, selections, comparisons)
+            options.append([
+                {'label': f"{value} ({counts.get(value, 0)})", 'value': value}
+                for value in facet_index.values.get(col, [])
+            ])
+        return options
+    return [
+        facet_index.options(col, facet_index.selection_mask(selections, comparisons, exclude=col))
+        for col in columns
+    ]
+
 # Apply filters from dropdowns to the table
 @callback(
     Output('harmonised-studies', 'filter_query'),
+    Output('harmonised-studies', 'page_current'),
     [
         Input('apply-filters-button', 'n_clicks'),
         # Dropdown filters
@@ -363,19 +586,17 @@ def update_table_filters(
     for i, filter_val in enumerate(dropdown_values):
         if filter_val and len(filter_val) > 0:
             col_name = dropdown_ids[i]['column']
-            # Build AND conditions for each selected value in this column
-            value_conditions = [f'{{{col_name}}} eq "{val}"' for val in filter_val]
-            column_condition = f"({' && '.join(value_conditions)})"
-            print(column_condition)
+            # Build OR conditions for each selected value in this column
+            value_conditions = [f'{{{col_name}}} eq "{filter_compiler.escape(val)}"' for val in filter_val]
+            column_condition = f"({' || '.join(value_conditions)})"
             filter_conditions.append(column_condition)
     
-    # Handle text search filters
+    # Handle text search filters: case-insensitive substring, answered from the search index
     for i, text_val in enumerate(text_values):
         if text_val and text_val.strip():
             col_name = text_ids[i]['column']
-            value_conditions = [f'{{{col_name}}} eq "{text_val}"']
+            value_conditions = [f'{{{col_name}}} icontains "{filter_compiler.escape(text_val.strip())}"']
             column_condition = f"({' && '.join(value_conditions)})"
-            print(column_condition)
             filter_conditions.append(column_condition)
     
     # Handle numeric comparison filters
@@ -391,24 +612,40 @@ def update_table_filters(
             }
             
             if operator in op_map:
-                value_conditions = [f'{{{col_name}}} {operator} "{value}"']
+                # Unquoted, so the value is compared as a number
+                value_conditions = [f'{{{col_name}}} {op_map[operator]} {value!r}']
                 column_condition = f"({' && '.join(value_conditions)})"
-                print(column_condition)
                 filter_conditions.append(column_condition)
     
-    # Combine all conditions with AND
+    # Combine all conditions with AND, and go back to the first page
     if filter_conditions:
-        return ' && '.join(filter_conditions)
+        return ' && '.join(filter_conditions), 0
     
-    return ''
+    return '', 0
 
-# Clear all filters
-@callback(
+# Clear all filters (in the browser, no server round trip)
+clientside_callback(
+    """
+    function(n_clicks, dropdown_ids, text_ids, operator_ids, value_ids) {
+        if (!n_clicks) {
+            return window.dash_clientside.no_update;
+        }
+        return [
+            dropdown_ids.map(() => []),  // Reset dropdown values
+            text_ids.map(() => ''),  // Reset text input values
+            operator_ids.map(() => null),  // Reset comparison operators
+            value_ids.map(() => null),  // Reset comparison values
+            '',  // Reset filter query
+            0  // Back to the first page
+        ];
+    }
+    """,
     Output({'type': 'filter-dropdown', 'column': ALL}, 'value'),
     Output({'type': 'text-filter', 'column': ALL}, 'value'),
     Output({'type': 'comparison-operator', 'column': ALL}, 'value'),
     Output({'type': 'comparison-value', 'column': ALL}, 'value'),
     Output('harmonised-studies', 'filter_query', allow_duplicate=True),
+    Output('harmonised-studies', 'page_current', allow_duplicate=True),
     Input('clear-filters-button', 'n_clicks'),
     State({'type': 'filter-dropdown', 'column': ALL}, 'id'),
     State({'type': 'text-filter', 'column': ALL}, 'id'),
@@ -416,49 +653,71 @@ def update_table_filters(
     State({'type': 'comparison-value', 'column': ALL}, 'id'),
     prevent_initial_call=True
 )
-def clear_filters(n_clicks, dropdown_filter_ids, text_filter_ids, comparison_operator_ids, comparison_value_ids):
-    if not n_clicks:
-        raise PreventUpdate
-
-    # Return empty values for all dropdowns, text inputs, comparison operators, and comparison values
-    return (
-        [[] for _ in range(len(dropdown_filter_ids))],  # Reset dropdown values
-        ['' for _ in range(len(text_filter_ids))],  # Reset text input values
-        [None for _ in range(len(comparison_operator_ids))],  # Reset comparison operators
-        [None for _ in range(len(comparison_value_ids))],  # Reset comparison values
-        ''  # Reset filter query
-    )
 
-# Fix Download Button to Export Filtered Data
+# Download the filtered data: a streamed TSV, or an export job for the other formats
 @callback(
-    Output('download-tsv-component', 'data'),
+    Output('download-location', 'href'),
+    Output('export-job', 'data'),
+    Output('export-interval', 'disabled'),
+    Output('export-status', 'children', allow_duplicate=True),
+    Output('export-progress-container', 'style', allow_duplicate=True),
     Input('download-tsv-button', 'n_clicks'),
     State('table-data-store', 'data'),
     State('harmonised-studies', 'filter_query'),
-    State('harmonised-studies', 'hidden_columns'),
+    State('harmonised-studies', 'columns'),
+    State('table-selected-ids', 'data'),
+    State('download-format', 'value'),
+    State('table-live-version', 'data'),
+    State('export-progress-container', 'style'),
     prevent_initial_call=True
 )
-def download_tsv(n_clicks, stored_data, filter_query, hidden_columns):
-    if not stored_data:
+def download_tsv(n_clicks, version, filter_query, columns, selected_ids, export_format, live_version, style):
+    if not version:
         raise PreventUpdate
+    version = live_version or version
+    visible = [col['id'] for col in columns or []]
+    hidden = {**(style or {}), 'display': 'none'}
+    shown = {**(style or {}), 'display': 'flex'}
+
+    # The browser fetches the TSV from the streaming route, so the file is
+    # never built in memory here. The export is saved server-side and the
+    # link carries only its key; errors are shown here rather than navigating
+    if export_format == 'tsv':
+        try:
+            key = export.save_request(version, filter_query, visible, selected_ids)
+        except (export.ExportUnavailable, filter_compiler.FilterQueryError) as e:
+            return no_update, no_update, True, f"Export failed: {e}", shown
+        return export.export_url(key), None, True, '', hidden
+
+    # Finished artifacts of the same export are served at once
+    key = export_jobs.submit(version, filter_query, visible, selected_ids, export_format)
+    if export_jobs.status(key)['status'] == 'done':
+        return export_jobs.download_url(key), None, True, '', hidden
+    return no_update, key, False, no_update, no_update
+
+# Report the progress of the export job, and download its artifact when done
+@callback(
+    Output('export-progress', 'value'),
+    Output('export-status', 'children'),
+    Output('export-progress-container', 'style'),
+    Output('download-location', 'href', allow_duplicate=True),
+    Output('export-interval', 'disabled', allow_duplicate=True),
+    Input('export-interval', 'n_intervals'),
+    Input('export-job', 'data'),
+    State('export-progress-container', 'style'),
+    prevent_initial_call=True
+)
+def update_export_progress(n_intervals, key, style):
+    if not key:
+        return 0, '', {**style, 'display': 'none'}, no_update, True
+
+    status = export_jobs.status(key)
+    if status['status'] == 'done':
+        return 100, '', {**style, 'display': 'none'}, export_jobs.download_url(key), True
+    if status['status'] in ('failed', 'unknown'):
+        return 0, f"Export failed: {status.get('error') or 'job lost'}", {**style, 'display': 'flex'}, no_update, True
 
-    df = pd.DataFrame(stored_data)
-
-    # Convert filter_query into actual filtering
-    if filter_query:
-        for condition in filter_query.split("&&"):
-            match = re.search(r'\{([^\}]+)\} eq "([^"]+)"', condition)
-            if match:
-                column = match.group(1)
-                value = match.group(2)
-                df = df[df[column] == value]
-
-    # Keep only the selected columns
-    selected_columns=list(set(df.columns)-set(hidden_columns))
-    df = df[selected_columns]
-
-    # Generate TSV file
-    return dict(
-        content=df.to_csv(index=False, sep='\t'), 
-        filename="GWAS_Catalog_harmstatus.tsv"
-    )
\ No newline at end of file
+    total = status.get('rows_total')
+    percent = 100 * status['rows_done'] / total if total else 0
+    text = f"{status['rows_done']:,} / {total:,} rows" if total is not None else "Preparing export"
+    return percent, text, {**style, 'display': 'flex'}, no_update, False
@@ -0,0 +1,56 @@
+# tests/test_backend_cache.py
+import threading
+import time
+
+import pytest
+
+from utils import backend, shared_cache
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """
+    A fresh shared cache, with a backend whose body never changes
+    """
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_PATH', str(tmp_path / 'shared.db'))
+    monkeypatch.setattr(shared_cache, 'enabled', True)
+    monkeypatch.setattr(shared_cache, 'local', threading.local())
+    backend.response_cache.clear()
+
+    def send_request(route, entry=None):
+        if entry is not None:
+            return entry._replace(fetched_at=time.time())  # 304
+        return backend.CachedResponse('v1', {'rows': [1, 2, 3]}, '"etag"', None, time.time())
+    monkeypatch.setattr(backend, 'send_request', send_request)
+
+    puts, gets = [], []
+    put, get = shared_cache.put, shared_cache.get
+    monkeypatch.setattr(shared_cache, 'put', lambda key, *args, **kwargs: puts.append(key) or put(key, *args, **kwargs))
+    monkeypatch.setattr(shared_cache, 'get', lambda key: gets.append(key) or get(key))
+    yield puts, gets
+    backend.response_cache.clear()
+
+def test_revalidation_does_not_republish(shared):
+    puts, _ = shared
+    backend.get_versioned('studies', refresh=True)
+    backend.get_versioned('studies', refresh=True)
+    backend.get_versioned('studies', refresh=True)
+    assert puts == ['backend:studies']
+
+def test_other_worker_skips_unchanged_value(shared):
+    _, gets = shared
+    backend.get_versioned('studies', refresh=True)
+    # Another worker holding the same version, fetched earlier
+    entry = backend.response_cache.get('studies')
+    backend.response_cache.set('studies', entry._replace(fetched_at=entry.fetched_at - 100))
+    version, data = backend.get_versioned('studies')
+    assert (version, data) == ('v1', {'rows': [1, 2, 3]})
+    assert gets == []
+    assert backend.response_cache.get('studies').fetched_at == entry.fetched_at
+
+def test_new_version_is_loaded(shared):
+    _, gets = shared
+    backend.get_versioned('studies', refresh=True)
+    entry = backend.response_cache.get('studies')
+    backend.response_cache.set('studies', entry._replace(version='v0', fetched_at=entry.fetched_at - 100))
+    assert backend.get_versioned('studies')[0] == 'v1'
+    assert gets == ['backend:studies']
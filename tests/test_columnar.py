@@ -0,0 +1,80 @@
+# tests/test_columnar.py
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import columnar
+
+@pytest.fixture(params=[
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(importlib.util.find_spec('pyarrow') is None, reason="needs pyarrow")),
+], ids=['decoded', 'arrow'])
+def snapshot_dir(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, 'COLUMNAR_DIR', str(tmp_path))
+    monkeypatch.setattr(columnar, 'has_arrow', request.param)
+    return tmp_path
+
+def round_trip(df):
+    columnar.write('v1', df)
+    return columnar.load('v1')
+
+def expected(df):
+    """
+    df as read back: text columns are pyarrow-backed strings with pyarrow
+    """
+    if not columnar.has_arrow:
+        return df
+    text = [col for col in df.columns if df[col].dtype == object]
+    return df.astype({col: pd.StringDtype('pyarrow', na_value=np.nan) for col in text})
+
+def is_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+def test_round_trip_keeps_values_and_dtypes(snapshot_dir):
+    df = pd.DataFrame({
+        'Study': ['GCST1', None, 'GCST3', 'Ünïcode ✓'],
+        'Harm_status': pd.Categorical(['failed', None, 'harmonised', 'failed']),
+        'Harm_drop_rate': [0.1, np.nan, 0.5, 0.0],
+        'Raw_N_variants': [1, 2, 3, 4],
+        'Latest_harm_start_date': pd.to_datetime(['2024-01-01', None, '2023-06-30 12:00', '2020-02-29'], format='ISO8601'),
+    })
+    pd.testing.assert_frame_equal(round_trip(df), expected(df))
+
+def test_text_columns(snapshot_dir):
+    loaded = round_trip(pd.DataFrame({'PMID': ['1', '2', None] * 5}))
+    assert loaded['PMID'].isna().tolist() == [False, False, True] * 5
+    assert loaded['PMID'].dropna().tolist() == ['1', '2'] * 5
+
+def test_numbers_and_codes_are_mapped(snapshot_dir):
+    loaded = round_trip(pd.DataFrame({'Harm_status': pd.Categorical(['b', 'a', None]), 'Harm_drop_rate': [0.1, 0.2, 0.3]}))
+    assert is_mapped(loaded['Harm_status'].cat.codes.to_numpy())
+    assert is_mapped(loaded['Harm_drop_rate'].to_numpy())
+    assert loaded['Harm_status'].tolist()[:2] == ['b', 'a']
+
+def test_arrow_text_is_not_copied(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(columnar, 'COLUMNAR_DIR', str(tmp_path))
+    monkeypatch.setattr(columnar, 'has_arrow', True)
+    loaded = round_trip(pd.DataFrame({'Study': [f'GCST{i}' for i in range(1000)]}))
+    data = loaded['Study'].array._pa_array.chunks[0].buffers()[2]
+    mapped = np.load(tmp_path / 'v1' / '0.offsets.npy', mmap_mode='r')  # Only to reach the file's pages
+    assert data.size == int(mapped[-1])
+    assert not data.is_mutable  # A read-only view of the mapped file, not an allocation
+
+def test_tz_aware_datetimes(snapshot_dir):
+    dates = pd.Series(pd.to_datetime(['2024-01-01T10:00:00+02:00', None], utc=True)).dt.tz_convert('Europe/Paris')
+    df = pd.DataFrame({'Latest_harm_start_date': dates})
+    pd.testing.assert_frame_equal(round_trip(df), df)
+
+def test_empty_columns(snapshot_dir):
+    df = pd.DataFrame({'Study': pd.Series([None, None], dtype=object), 'Harm_status': pd.Categorical([None, None], categories=pd.Index([], dtype=object))})
+    pd.testing.assert_frame_equal(round_trip(df), expected(df))
+
+def test_missing_snapshot(snapshot_dir):
+    assert columnar.load('unknown') is None
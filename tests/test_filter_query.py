@@ -0,0 +1,110 @@
+# tests/test_filter_query.py
+import pytest
+import numpy as np
+import pandas as pd
+
+from utils import filter_query
+from utils.filter_query import FilterQueryError, tokenize, parse, mask
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'Study': ['GCST1', 'GCST2', 'GCST3', 'GCST4'],
+        'PMID': ['100', '20', None, '3'],
+        'Harm_status': pd.Categorical(['harmonised', None, 'failed', 'Failed']),
+        'Harm_drop_rate': [0.2, np.nan, 0.05, 0.5],
+        'First_author': ['Smith J', None, 'smithson K', 'Li X'],
+    })
+
+def rows(df, query):
+    return df.index[mask(df, query)].tolist()
+
+def test_tokenize():
+    assert tokenize('{Harm_drop_rate} >= 0.1 && !({Study} contains "GC ST")') == [
+        ('column', '{Harm_drop_rate}'), ('symbol', '>='), ('word', '0.1'), ('symbol', '&&'),
+        ('symbol', '!'), ('symbol', '('), ('column', '{Study}'), ('word', 'contains'),
+        ('string', '"GC ST"'), ('symbol', ')'),
+    ]
+
+def test_tokenize_word_operators():
+    assert [text for _, text in tokenize('{a} eq 1 and not {b} eq 2 or {c} eq 3')] == [
+        '{a}', 'eq', '1', '&&', '!', '{b}', 'eq', '2', '||', '{c}', 'eq', '3'
+    ]
+
+def test_and_binds_tighter_than_or():
+    assert parse('{a} eq 1 || {b} eq 2 && {c} eq 3') == (
+        'or', ('cmp', 'a', 'eq', 1.0), ('and', ('cmp', 'b', 'eq', 2.0), ('cmp', 'c', 'eq', 3.0))
+    )
+
+def test_not_binds_tighter_than_and():
+    assert parse('!{a} eq 1 && {b} eq 2') == ('and', ('not', ('cmp', 'a', 'eq', 1.0)), ('cmp', 'b', 'eq', 2.0))
+
+def test_parentheses_group(df):
+    assert rows(df, '({Harm_drop_rate} gt 0.1 || {Study} eq "GCST3") && {First_author} icontains "smith"') == [0, 2]
+
+def test_missing_literal(df):
+    assert rows(df, '{Harm_drop_rate} != NA') == [0, 2, 3]
+    assert rows(df, '{Harm_drop_rate} = NA') == [1]
+    assert rows(df, '{Harm_status} ne "NA"') == [0, 2, 3]
+
+@pytest.mark.parametrize('value', ['say "hi"', 'C:\\path\\', 'back\\"slash', 'plain'])
+def test_escaped_values_round_trip(value):
+    assert parse(f'{{Study}} eq "{filter_query.escape(value)}"') == ('cmp', 'Study', 'eq', value)
+
+def test_escaped_dropdown_value_filters(df):
+    df = df.assign(First_author=['O"Brien \\ J', None, 'smithson K', 'Li X'])
+    assert rows(df, f'({{First_author}} eq "{filter_query.escape(df.First_author[0])}")') == [0]
+
+def test_numeric_and_quoted_values():
+    assert parse('{PMID} eq 20') == ('cmp', 'PMID', 'eq', 20.0)
+    assert parse('{PMID} eq "20"') == ('cmp', 'PMID', 'eq', '20')
+
+def test_numeric_value_orders_text_as_numbers(df):
+    # Numeric ordering on a text column: "100" > 50, though "100" < "50"
+    assert rows(df, '{PMID} gt 50') == [0]
+    assert rows(df, '{PMID} gt "50"') == []
+
+def test_numeric_column(df):
+    assert rows(df, '{Harm_drop_rate} > 0.1') == [0, 3]
+    assert rows(df, '{Harm_drop_rate} ne 0.2') == [1, 2, 3]
+
+def test_quoted_value_with_escapes():
+    assert parse(r'{Study} eq "say \"hi\""') == ('cmp', 'Study', 'eq', 'say "hi"')
+
+def test_contains_is_case_sensitive(df):
+    assert rows(df, '{First_author} contains "Smith"') == [0]
+
+def test_icontains_ignores_case(df):
+    assert rows(df, '{First_author} icontains "SMITH"') == [0, 2]
+    assert rows(df, '{Harm_status} icontains "fail"') == [2, 3]
+
+def test_contains_skips_missing_values(df):
+    assert rows(df, '{First_author} contains "None"') == []
+
+def test_categorical_column(df):
+    assert rows(df, '{Harm_status} eq "failed"') == [2]
+    assert rows(df, '!({Harm_status} eq "failed")') == [0, 1, 3]
+    assert rows(df, '{Harm_status} is nil') == [1]
+
+def test_unknown_column_matches_nothing(df):
+    assert rows(df, '{Missing} eq 1') == []
+
+def test_empty_query_matches_everything(df):
+    assert parse('  ') is None
+    assert rows(df, '') == [0, 1, 2, 3]
+    assert filter_query.apply(df, '') is df
+
+@pytest.mark.parametrize('query', [
+    '{Study} eq',
+    '{Study} like "x"',
+    '({Study} eq "x"',
+    '{Study} eq "x")',
+    '{Study} eq "x" &&',
+    '&& {Study} eq "x"',
+    '{Study} eq "unterminated',
+    '{Study} is odd',
+    '{Study} eq "x" {PMID} eq 1',
+])
+def test_malformed_queries(query):
+    with pytest.raises(FilterQueryError):
+        parse(query)
@@ -0,0 +1,40 @@
+# tests/test_search.py
+import pandas as pd
+import pytest
+
+from utils import dataset, export, search
+
+def table(rows):
+    return pd.DataFrame({'Study': [f'GCST{i}' for i in range(rows)], 'First_author': ['Smith J'] * rows})
+
+@pytest.fixture
+def evicted(monkeypatch):
+    """
+    A client's version 'old' whose table was evicted, while its search index
+    is still cached; the current version is 'new'
+    """
+    dataset.dataset_cache.clear()
+    search.search_cache.clear()
+    dataset.dataset_cache.set('old', table(10))
+    search.get_search_index('old')
+    dataset.dataset_cache.clear()
+    dataset.dataset_cache.set('new', table(40))
+    monkeypatch.setattr(dataset, 'load_dataset', lambda refresh=False: 'new')
+    yield
+    dataset.dataset_cache.clear()
+    search.search_cache.clear()
+
+def test_resolve_dataset_falls_back_to_current(evicted):
+    version, df = dataset.resolve_dataset('old')
+    assert version == 'new'
+    assert len(df) == 40
+
+def test_export_uses_index_of_resolved_table(evicted):
+    df, row_mask = export.export_rows('old', '{Study} contains "GCST1"')
+    assert len(row_mask) == 40
+    assert df.index[row_mask].tolist() == [1] + list(range(10, 20))
+
+def test_index_for_query_matches_substrings():
+    index = search.SearchIndex(table(12))
+    assert index.mask('Study', 'gcst1', case=False).sum() == 3
+    assert index.mask('Study', 'gcst1', case=True).sum() == 0
@@ -0,0 +1,89 @@
+# tests/test_sql_parity.py
+import threading
+
+import pytest
+
+from utils import dataset, study_db, filter_query
+
+# Small study table with missing values in every kind of column
+records = [
+    {'Study': 'GCST1', 'PMID': '301', 'First_author': 'Smith J', 'Harm_status': 'harmonised',
+     'Harm_drop_rate': '0.20', 'Raw_N_variants': 100, 'Latest_harm_start_date': '2024-06-01'},
+    {'Study': 'GCST2', 'PMID': '302', 'First_author': None, 'Harm_status': None,
+     'Harm_drop_rate': None, 'Raw_N_variants': 300, 'Latest_harm_start_date': None},
+    {'Study': 'GCST3', 'PMID': '303', 'First_author': 'Jones A', 'Harm_status': 'failed',
+     'Harm_drop_rate': '0.05', 'Raw_N_variants': 200, 'Latest_harm_start_date': '2023-01-15'},
+    {'Study': 'GCST4', 'PMID': '304', 'First_author': 'smithson K', 'Harm_status': 'failed',
+     'Harm_drop_rate': '0.20', 'Raw_N_variants': None, 'Latest_harm_start_date': '2024-06-20'},
+    {'Study': 'GCST5', 'PMID': None, 'First_author': 'Li X', 'Harm_status': 'harmonised',
+     'Harm_drop_rate': '0.50', 'Raw_N_variants': 50, 'Latest_harm_start_date': '2022-11-30'},
+]
+
+queries = [
+    '',
+    '{Harm_status} eq "failed"',
+    '!({Harm_status} eq "failed")',
+    '{Harm_status} ne "failed"',
+    '!({Harm_drop_rate} gt 0.1)',
+    '{Harm_drop_rate} gt 0.1 || {Raw_N_variants} lt 150',
+    '!({Harm_drop_rate} gt 0.1 && {Raw_N_variants} lt 150)',
+    '!(!({Harm_status} eq "failed"))',
+    '{Harm_drop_rate} != NA',
+    '{Harm_drop_rate} = NA',
+    '{First_author} icontains "smith"',
+    '{First_author} contains "smith"',
+    '!({First_author} icontains "smith")',
+    '{Latest_harm_start_date} datestartswith "2024-06"',
+    '{Latest_harm_start_date} > "2023-06-01"',
+    '{Latest_harm_start_date} gt 2023',
+    '{Latest_harm_start_date} le 2023',
+    '{Latest_harm_start_date} ne "2024-06-01"',
+    '{Latest_harm_start_date} eq 20240601',
+    '!({Latest_harm_start_date} lt "2024")',
+    '{Latest_harm_start_date} gt 0.5',
+    '{Latest_harm_start_date} gt "June"',
+    '{PMID} is nil',
+]
+
+sorts = [
+    None,
+    [{'column_id': 'Harm_drop_rate', 'direction': 'asc'}],
+    [{'column_id': 'Harm_drop_rate', 'direction': 'desc'}],
+    [{'column_id': 'Harm_status', 'direction': 'asc'}, {'column_id': 'Raw_N_variants', 'direction': 'desc'}],
+    [{'column_id': 'Latest_harm_start_date', 'direction': 'asc'}],
+]
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    """
+    The study table, parsed as the app does and materialized into a fresh study database
+    """
+    df = dataset.parse_records(records)
+    saved = study_db.STUDY_DB_PATH, study_db.enabled, study_db.local
+    study_db.STUDY_DB_PATH = str(tmp_path_factory.mktemp('db') / 'studies.db')
+    study_db.enabled = True
+    study_db.local = threading.local()
+    study_db.materialize('v1', df, dataset.search_columns)
+    yield df
+    study_db.STUDY_DB_PATH, study_db.enabled, study_db.local = saved
+
+@pytest.mark.parametrize('query', queries)
+def test_filter_matches_pandas(table, query):
+    expected = table.index[filter_query.mask(table, query)].tolist()
+    page, total = study_db.query_page(query, None, 0, 100)
+    assert page.index.tolist() == expected
+    assert total == len(expected)
+
+@pytest.mark.parametrize('sort_by', sorts)
+def test_sort_matches_pandas(table, sort_by):
+    expected = dataset.sort_table(table, sort_by).index.tolist()
+    page, _ = study_db.query_page('', sort_by, 0, 100)
+    assert page.index.tolist() == expected
+
+def test_negation_keeps_missing_values(table):
+    page, _ = study_db.query_page('!({Harm_status} eq "failed")', None, 0, 100)
+    assert 1 in page.index  # GCST2 has no status
+
+def test_missing_values_sort_last_ascending(table):
+    page, _ = study_db.query_page('', [{'column_id': 'Harm_drop_rate', 'direction': 'asc'}], 0, 100)
+    assert page.index.tolist()[-1] == 1
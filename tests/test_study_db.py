@@ -0,0 +1,49 @@
+# tests/test_study_db.py
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils import dataset, study_db
+
+records = [
+    {'Study': 'GCST1', 'PMID': '301', 'Harm_status': 'harmonised', 'Harm_drop_rate': '0.20'},
+    {'Study': 'GCST2', 'PMID': '302', 'Harm_status': 'failed', 'Harm_drop_rate': None},
+]
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    A fresh study database holding version v1
+    """
+    monkeypatch.setattr(study_db, 'STUDY_DB_PATH', str(tmp_path / 'studies.db'))
+    monkeypatch.setattr(study_db, 'enabled', True)
+    monkeypatch.setattr(study_db, 'local', threading.local())
+    df = dataset.parse_records(records)
+    assert study_db.materialize('v1', df)
+    return df
+
+def test_same_version_skips_the_write_lock(db, monkeypatch):
+    monkeypatch.setattr(study_db, 'begin_write', lambda conn: pytest.fail("took the write lock"))
+    assert study_db.materialize('v1', db)
+
+def test_busy_writer_keeps_previous_snapshot(db):
+    other = sqlite3.connect(study_db.STUDY_DB_PATH, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # Another worker materializing
+    try:
+        started = time.time()
+        assert not study_db.materialize('v2', db)
+        assert time.time() - started < 1
+        assert study_db.current_version() == 'v1'
+        assert study_db.query_page('', None, 0, 10)[1] == 2
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert study_db.materialize('v2', db)
+    assert study_db.current_version() == 'v2'
+
+def test_busy_thread_does_not_wait(db):
+    with study_db.write_lock:
+        assert not study_db.materialize('v2', db)
+    assert study_db.current_version() == 'v1'
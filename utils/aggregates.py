@@ -0,0 +1,95 @@
+# utils/aggregates.py
+import os
+
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Default windows of the summary plots
+RECENT_MONTHS = int(os.environ.get('HARMSTATUS_RECENT_MONTHS', 6))
+DROP_RATE_YEARS = int(os.environ.get('HARMSTATUS_DROP_RATE_YEARS', 10))
+DROP_RATE_THRESHOLD = float(os.environ.get('HARMSTATUS_DROP_RATE_THRESHOLD', 0.15))
+
+# Genotyping types with their own drop-rate panel
+genotyping_types = ['array', 'sequencing', 'mix']
+
+def harm_dates(df):
+    dates = df['Latest_harm_start_date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors='coerce')
+    return dates
+
+def clean_text(series, lower=False):
+    """
+    Stripped (and optionally lower-cased) text of a column. Categorical
+    columns are cleaned once per category and mapped through their codes
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        text = series.astype(str).str.strip()
+        return text.str.lower() if lower else text
+    text = series.cat.categories.astype(str).str.strip()
+    if lower:
+        text = text.str.lower()
+    values = np.append(text.to_numpy(dtype=object), 'None')  # Code -1: missing, like str(None)
+    return pd.Series(values[series.cat.codes.to_numpy()], index=series.index)
+
+def status_counts(df):
+    """
+    Number of unique studies per harmonisation status
+    """
+    counts = (
+        df.assign(Harm_status=clean_text(df['Harm_status']))
+        .groupby('Harm_status', observed=True)['Study']
+        .nunique()
+    )
+    return counts.rename('num_unique_studies').reset_index()
+
+def harmonised_per_month(df, months=RECENT_MONTHS, now=None):
+    """
+    Number of studies whose latest harmonisation started in each of the
+    last `months` calendar months, including months with none
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    end = now.to_period('M')
+    start = end - (months - 1)
+
+    periods = harm_dates(df).dt.to_period('M')
+    in_window = periods.between(start, end)
+    counts = periods[in_window].value_counts().reindex(pd.period_range(start, end, freq='M'), fill_value=0)
+    return pd.DataFrame({'month': counts.index.strftime('%Y-%m'), 'num_studies': counts.to_numpy()})
+
+def drop_rates(df, years=DROP_RATE_YEARS, threshold=DROP_RATE_THRESHOLD, now=None):
+    """
+    Studies of the last `years` years with a drop rate above threshold, split
+    by genotyping type: {genotyping type: DataFrame(Study, Harm_drop_rate, year)}
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    rates = pd.to_numeric(df['Harm_drop_rate'], errors='coerce')
+    year = harm_dates(df).dt.year
+    kind = clean_text(df['Genotyping_type'], lower=True)
+
+    keep = (rates > threshold) & (year > now.year - years) & kind.isin(genotyping_types)
+    selected = pd.DataFrame({
+        'Study': df['Study'][keep],
+        'Harm_drop_rate': rates[keep],
+        'year': year[keep].astype(int),
+        'Genotyping_type': kind[keep],
+    })
+
+    groups = dict(tuple(selected.groupby('Genotyping_type', observed=True)))
+    return {
+        name: groups.get(name, selected.iloc[:0]).drop(columns='Genotyping_type').reset_index(drop=True)
+        for name in genotyping_types
+    }
+
+def summary_tables(df, months=RECENT_MONTHS, years=DROP_RATE_YEARS, threshold=DROP_RATE_THRESHOLD, now=None):
+    """
+    All summary-plot tables from one study table, shaped like the backend's
+    plotly/* endpoints: status, newly_harmonised, array, sequencing and mix
+    """
+    return {
+        'status': status_counts(df),
+        'newly_harmonised': harmonised_per_month(df, months, now),
+        **drop_rates(df, years, threshold, now),
+    }
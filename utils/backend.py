@@ -0,0 +1,222 @@
+# utils/backend.py
+import os
+import time
+import logging
+import hashlib
+import threading
+from typing import NamedTuple, Optional
+
+from utils import metrics, shared_cache
+from utils.cache import TTLCache
+from utils.lazy import lazy_import
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+# Backend settings, overridable from the environment
+BASE_URL = os.environ.get('HARMSTATUS_BACKEND_URL', 'http://127.0.0.1:8000/')
+CONNECT_TIMEOUT = float(os.environ.get('HARMSTATUS_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('HARMSTATUS_READ_TIMEOUT', 30))
+CACHE_TTL = float(os.environ.get('HARMSTATUS_CACHE_TTL', 60))
+CACHE_SIZE = int(os.environ.get('HARMSTATUS_CACHE_SIZE', 32))
+POOL_SIZE = int(os.environ.get('HARMSTATUS_POOL_SIZE', 10))
+MAX_CONCURRENT = int(os.environ.get('HARMSTATUS_BACKEND_CONCURRENCY', POOL_SIZE))
+BREAKER_FAILURES = int(os.environ.get('HARMSTATUS_BREAKER_FAILURES', 5))
+BREAKER_RESET = float(os.environ.get('HARMSTATUS_BREAKER_RESET', 30))
+
+# One pooled session shared by every page, so connections are kept alive;
+# created on first use, so requests is not imported at startup
+session = None
+session_lock = threading.Lock()
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+    return session
+
+class CircuitBreaker:
+    """
+    Fails backend requests fast once the backend looks down. After failures
+    consecutive failures the circuit opens for reset_seconds; then a single
+    trial request is let through, which closes it again or reopens it
+    """
+
+    def __init__(self, failures, reset_seconds):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive = 0
+        self.opened_at = None  # time.monotonic() when the circuit opened
+        self.trial = False  # A trial request is in flight
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.trial = True
+            return True
+
+    def succeeded(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failed(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.trial or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self.trial else 'open'
+
+    def stats(self):
+        return {'state': self.state(), 'consecutive_failures': self.consecutive}
+
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+
+# Requests in flight to the backend, across all threads of this process;
+# callers that cannot get a slot within the connect timeout fail fast
+fetch_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+def is_backend_failure(error):
+    """
+    Whether an error counts against the circuit breaker: connection errors,
+    timeouts, server errors and undecodable bodies, but not client errors
+    """
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+# Last response per route; entries older than CACHE_TTL are revalidated
+# with the backend (If-None-Match / If-Modified-Since) before reuse
+response_cache = TTLCache(maxsize=CACHE_SIZE, name='backend_responses')
+
+# Set while the background refresher keeps the cache warm: callers are then
+# served the latest snapshot and only the refresher talks to the backend
+serve_snapshots = False
+
+class CachedResponse(NamedTuple):
+    version: str
+    data: object
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+def get_versioned(route='', max_age=None, refresh=False):
+    """
+    Fetch a backend route and return (version, decoded JSON). Responses younger
+    than max_age seconds (default CACHE_TTL) are served from the cache; older
+    ones, or any with refresh=True, are revalidated, so an unchanged route
+    costs only a 304. The version is a hash of the response body, so it only
+    changes when the backend data does. If the backend fails, the last good
+    response is served stale. Raises requests.exceptions.RequestException
+    when the backend fails and nothing is cached
+    """
+    max_age = CACHE_TTL if max_age is None else max_age
+    entry = response_cache.get(route)
+
+    # Pick up a newer response published by another worker. A revalidation
+    # that left the data unchanged only moves the timestamp, so the value is
+    # loaded only when its version differs from ours
+    shared_key = 'backend:' + route
+    meta = shared_cache.get_meta(shared_key)
+    if meta is not None and (entry is None or meta[1] > entry.fetched_at):
+        if entry is not None and meta[0] == entry.version:
+            entry = entry._replace(fetched_at=meta[1])
+        else:
+            entry = shared_cache.get(shared_key)[2]
+        response_cache.set(route, entry)
+
+    if entry is not None and not refresh:
+        if serve_snapshots or time.time() - entry.fetched_at < max_age:
+            return entry.version, entry.data
+
+    # Only one worker fetches a route at a time; the others keep serving
+    # what they have until it is published
+    lease = 'fetch:' + route
+    if not shared_cache.acquire(lease, CONNECT_TIMEOUT + READ_TIMEOUT) and entry is not None:
+        return entry.version, entry.data
+
+    previous = entry
+    try:
+        entry = fetch(route, entry)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if entry is None:
+            raise
+        logger.warning("Serving stale %r, backend fetch failed: %s", route, e)
+        return entry.version, entry.data
+    finally:
+        shared_cache.release(lease)
+
+    response_cache.set(route, entry)
+    # A 304 or an unchanged body only refreshes the shared timestamp
+    unchanged = previous is not None and previous.version == entry.version
+    if not (unchanged and shared_cache.touch(shared_key, entry.fetched_at)):
+        shared_cache.put(shared_key, entry, version=entry.version, updated=entry.fetched_at)
+    return entry.version, entry.data
+
+def fetch(route, entry=None):
+    """
+    Request a route from the backend, conditionally if entry holds a previous
+    response. Returns the new (or revalidated) CachedResponse. Fails fast,
+    without a request, while the circuit breaker is open or every backend
+    slot stays busy for the connect timeout
+    """
+    if not fetch_slots.acquire(timeout=CONNECT_TIMEOUT):
+        raise requests.exceptions.Timeout(f"{MAX_CONCURRENT} backend requests already in flight")
+    try:
+        if not breaker.allow():
+            raise requests.exceptions.ConnectionError(
+                f"Backend circuit open after {breaker.consecutive} consecutive failures"
+            )
+        try:
+            entry = send_request(route, entry)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if is_backend_failure(e):
+                breaker.failed()
+            else:
+                breaker.succeeded()  # The backend answered
+            raise
+        breaker.succeeded()
+        return entry
+    finally:
+        fetch_slots.release()
+
+def send_request(route, entry=None):
+    """
+    Send one (conditional) request for a route and decode the response
+    """
+    # Conditional request when we already hold a copy of this route
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+    with metrics.timed(metrics.backend_fetch_seconds, route=route or '/'):
+        response = get_session().get(BASE_URL + route, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if response.status_code == 304 and entry is not None:
+            return entry._replace(fetched_at=time.time())
+
+        response.raise_for_status()
+        return CachedResponse(
+            version=hashlib.sha1(response.content).hexdigest(),
+            data=response.json(),
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            fetched_at=time.time()
+        )
@@ -0,0 +1,34 @@
+# utils/background.py
+import os
+import logging
+
+from utils import columnar, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Directory of the diskcache that long callbacks run through; unset runs them
+# in the request. Needs the optional diskcache and multiprocess packages (the
+# background extra). Background jobs run in their own processes, so they are
+# only used with a cache those share with the web workers: the shared cache or
+# the columnar snapshots. Otherwise every worker would fetch and parse the
+# study list again after the job
+BACKGROUND_CACHE_DIR = os.environ.get('HARMSTATUS_BACKGROUND_CACHE')
+
+# Background callback manager, or None when background callbacks are off
+manager = None
+
+if BACKGROUND_CACHE_DIR and not (shared_cache.enabled or columnar.enabled):
+    logger.warning(
+        "Background callbacks disabled, they need HARMSTATUS_SHARED_CACHE or "
+        "HARMSTATUS_COLUMNAR_DIR to share their results with the web workers"
+    )
+elif BACKGROUND_CACHE_DIR:
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+        manager = DiskcacheManager(diskcache.Cache(BACKGROUND_CACHE_DIR))
+    except ImportError as e:
+        logger.warning("Background callbacks disabled, %s is not installed", e.name)
+
+# Passed as background= to the callbacks that may wait on the backend
+enabled = manager is not None
@@ -0,0 +1,72 @@
+# utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+# Named caches, for the cache statistics route
+cache_registry = {}
+
+class TTLCache:
+    """
+    Thread-safe key/value cache with an optional time-to-live and
+    least-recently-used eviction once maxsize entries are held. Caches given
+    a name are listed by cache_stats()
+    """
+
+    def __init__(self, maxsize=128, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds, None means entries never expire
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if name:
+            cache_registry[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._entries[key]  # Expired
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)  # Drop the least recently used
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+def cache_stats():
+    """
+    Hit/miss statistics of every named cache
+    """
+    stats = {}
+    for name, cache in cache_registry.items():
+        stats[name] = cache.stats()
+        lookups = stats[name]['hits'] + stats[name]['misses']
+        stats[name]['hit_rate'] = stats[name]['hits'] / lookups if lookups else None
+    return stats
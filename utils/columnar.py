@@ -0,0 +1,188 @@
+# utils/columnar.py
+import os
+import json
+import shutil
+import fcntl
+import importlib.util
+
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+
+# Directory of the memory-mapped study table snapshots; unset disables them
+COLUMNAR_DIR = os.environ.get('HARMSTATUS_COLUMNAR_DIR')
+
+enabled = bool(COLUMNAR_DIR)
+
+# With the optional pyarrow (the export extra), text columns are read as
+# pyarrow-backed strings over the mapped buffers instead of being decoded
+has_arrow = importlib.util.find_spec('pyarrow') is not None
+
+# Layout of a snapshot, COLUMNAR_DIR/<version>/:
+#   columns.json          column names, kinds and dtypes, in table order
+#   <i>.npy               values of numeric and datetime columns (datetimes as
+#                         int64; tz-aware ones in UTC, with their tz in columns.json)
+#   <i>.codes.npy         codes of Categorical columns, -1 for missing values
+#   <i>.str.bin/.offsets.npy  strings as one UTF-8 buffer and the byte offsets
+#                         of its values: the sorted dictionary of a Categorical,
+#                         or every row of a text column (Arrow's large_string layout)
+#   <i>.valid.npy         validity bitmap of a text column, as in Arrow
+# Numeric, datetime, code and, with pyarrow, text arrays are memory-mapped
+# read-only, so their pages are shared by every worker process through the OS
+# page cache. Text columns are then pandas strings with NaN for missing values.
+# Without pyarrow they are decoded into object columns in each worker, as are
+# the small dictionaries of the Categoricals in any case
+
+def path(*names):
+    return os.path.join(COLUMNAR_DIR, *names)
+
+def code_dtype(size):
+    """
+    Narrowest code dtype pandas uses for a dictionary of size values, so the
+    mapped codes back the Categorical without a copy
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def write_strings(name, values):
+    """
+    Write strings as one UTF-8 buffer and the byte offsets of each value
+    """
+    encoded = [value.encode() for value in values]
+    np.save(name + '.offsets.npy', np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64))
+    with open(name + '.str.bin', 'wb') as f:
+        f.write(b''.join(encoded))
+
+def read_strings(name):
+    """
+    Strings written by write_strings, decoded into an object array
+    """
+    offsets = np.load(name + '.offsets.npy').tolist()
+    with open(name + '.str.bin', 'rb') as f:
+        data = f.read()
+    values = np.empty(len(offsets) - 1, dtype=object)
+    values[:] = [data[start:end].decode() for start, end in zip(offsets[:-1], offsets[1:])]
+    return values
+
+def map_strings(name):
+    """
+    Text column written by write_column as pandas strings backed by a pyarrow
+    array over the mapped files, without a copy
+    """
+    offsets = np.load(name + '.offsets.npy', mmap_mode='r')
+    valid = np.load(name + '.valid.npy', mmap_mode='r')
+    # An empty file maps to a null buffer, which arrow rejects
+    data = pa.memory_map(name + '.str.bin').read_buffer() if offsets[-1] else pa.py_buffer(b'')
+    array = pa.Array.from_buffers(pa.large_string(), len(offsets) - 1, [pa.py_buffer(valid), pa.py_buffer(offsets), data])
+    return pd.StringDtype('pyarrow', na_value=np.nan).__from_arrow__(array)
+
+def write_column(directory, i, series):
+    """
+    Write one column and return its manifest entry
+    """
+    name = os.path.join(directory, str(i))
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # asi8: int64 since the epoch, in UTC for tz-aware columns; NaT is the minimum
+        values = series.array
+        np.save(name + '.npy', values.asi8)
+        tz = str(series.dt.tz) if series.dt.tz is not None else None
+        return {'kind': 'datetime', 'dtype': f'datetime64[{values.unit}]', 'tz': tz}
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        np.save(name + '.npy', series.to_numpy())
+        return {'kind': 'numeric', 'dtype': str(series.dtype)}
+
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        missing = series.isna().to_numpy()
+        np.save(name + '.valid.npy', np.packbits(~missing, bitorder='little'))
+        write_strings(name, ['' if absent else str(value) for value, absent in zip(series.to_numpy(dtype=object), missing)])
+        return {'kind': 'text'}
+
+    # Categorical: sorted dictionary, so code order is sort order. Categories
+    # are stringified and sorted, rather than every row
+    categories = np.array([str(value) for value in series.cat.categories], dtype=object)
+    ranks, values = pd.factorize(categories, sort=True)
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, ranks[codes] if len(ranks) else codes, -1)
+    np.save(name + '.codes.npy', codes.astype(code_dtype(len(values))))
+    write_strings(name, values)
+    return {'kind': 'category'}
+
+def read_column(directory, i, entry):
+    name = os.path.join(directory, str(i))
+    if entry['kind'] == 'category':
+        codes = np.load(name + '.codes.npy', mmap_mode='r')
+        return pd.Categorical.from_codes(codes, categories=pd.Index(read_strings(name), dtype=object))
+    if entry['kind'] == 'text':
+        if has_arrow:
+            return map_strings(name)
+        values = read_strings(name)
+        valid = np.unpackbits(np.load(name + '.valid.npy'), count=len(values), bitorder='little')
+        values[valid == 0] = None
+        return values
+    values = np.load(name + '.npy', mmap_mode='r').view(np.ndarray)  # Still backed by the mapping
+    if entry['kind'] == 'datetime':
+        values = values.view(entry['dtype'])
+        if entry.get('tz'):
+            return pd.DatetimeIndex(values, copy=False).tz_localize('UTC').tz_convert(entry['tz'])
+    return values
+
+def write(version, df):
+    """
+    Write the snapshot of a dataset version. The files are written to a
+    temporary directory and renamed into place, so readers never see a
+    partial snapshot
+    """
+    staging = path(f'.{version}.{os.getpid()}')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest = [dict(write_column(staging, i, df[col]), name=col) for i, col in enumerate(df.columns)]
+    with open(os.path.join(staging, 'columns.json'), 'w') as f:
+        json.dump({'rows': len(df), 'columns': manifest}, f)
+    os.rename(staging, path(version))
+
+def load(version):
+    """
+    The study table of a version, backed by the mapped snapshot, or None if
+    there is no snapshot of it. Numeric and datetime columns, Categorical
+    codes and, with pyarrow, text columns are not copied
+    """
+    directory = path(version)
+    try:
+        with open(os.path.join(directory, 'columns.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    columns = {entry['name']: read_column(directory, i, entry) for i, entry in enumerate(manifest['columns'])}
+    return pd.DataFrame(columns, index=pd.RangeIndex(manifest['rows']), copy=False)
+
+def get_or_write(version, build):
+    """
+    Load the snapshot of a version, building and writing it first if no
+    worker has yet. Workers wait on a file lock rather than parsing twice
+    """
+    df = load(version)
+    if df is not None:
+        return df
+    os.makedirs(COLUMNAR_DIR, exist_ok=True)
+    with open(path('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.isdir(path(version)):
+                write(version, build())
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return load(version)
+
+def prune(keep):
+    """
+    Delete all but the keep most recently written snapshots. Workers that
+    still map a deleted snapshot keep reading it until they drop it
+    """
+    versions = [name for name in os.listdir(COLUMNAR_DIR) if not name.startswith('.')]
+    versions.sort(key=lambda name: os.path.getmtime(path(name)), reverse=True)
+    for name in versions[keep:]:
+        shutil.rmtree(path(name), ignore_errors=True)
@@ -0,0 +1,160 @@
+# utils/dataset.py
+import os
+
+from utils import backend, columnar, history, metrics, refresher, schema, shared_cache, study_db
+from utils.cache import TTLCache
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
+
+# Columns watched by the live refresh, and the column identifying a study
+tracked_columns = ['Harm_status', 'Latest_harm_start_date', 'Harm_drop_rate', 'Liftover_drop_rate']
+key_column = 'Study'
+
+# Free-text searchable columns, indexed for substring search
+search_columns = ['PMID', 'First_author', 'Study']
+
+# Parsed study tables per dataset version; a few are kept so sessions
+# opened before a data change keep working
+dataset_cache = TTLCache(maxsize=int(os.environ.get('HARMSTATUS_DATASET_VERSIONS', 3)), name='datasets')
+
+# Version of the most recently loaded study list in this process
+latest_version = None
+
+def parse_records(records):
+    """
+    Build the typed study table from the backend records (see utils.schema)
+    """
+    with metrics.timed(metrics.stage_seconds, stage='parse'):
+        return schema.apply(pd.DataFrame(records))
+
+def load_dataset(max_age=None, refresh=False):
+    """
+    Fetch the study list and return its version key, parsing it into the
+    dataset cache if this version has not been seen before. max_age and
+    refresh are passed to the backend cache. When the backend is unavailable
+    the last materialized snapshot is used if there is one, otherwise None
+    is returned
+    """
+    global latest_version
+
+    try:
+        version, records = backend.get_versioned("", max_age=max_age, refresh=refresh)
+    except (requests.exceptions.RequestException, ValueError):
+        return load_snapshot()
+    if not records:
+        return load_snapshot()
+
+    df = dataset_cache.get(version)
+    new = df is None
+    if new:
+        df = build_dataset(version, records)
+        dataset_cache.set(version, df)
+        history.record(version, df)
+    # Once the background refresher runs, only it materializes, off the request path
+    if refresher.in_refresh() or (new and not backend.serve_snapshots):
+        study_db.materialize(version, df, search_columns)
+    latest_version = version
+    return version
+
+def build_dataset(version, records):
+    """
+    Parse a version of the study list once across all workers: into the
+    memory-mapped columnar snapshot every worker maps when it is enabled,
+    otherwise through the shared cache, if that is
+    """
+    if columnar.enabled:
+        df = columnar.get_or_write(version, lambda: parse_records(records))
+        columnar.prune(keep=dataset_cache.maxsize)
+        return df
+    df = shared_cache.get_or_build('dataset:' + version, lambda: parse_records(records), version=version)
+    shared_cache.prune('dataset:', keep=dataset_cache.maxsize)
+    return df
+
+def load_snapshot():
+    """
+    Version of the last materialized study table, loading it into the
+    dataset cache. None when there is no snapshot
+    """
+    global latest_version
+
+    version = study_db.current_version()
+    if not version:
+        return None
+    if dataset_cache.get(version) is None:
+        dataset_cache.set(version, study_db.load_frame())
+    latest_version = version
+    return version
+
+def get_dataset(version):
+    """
+    Return the study table for a version key held by a client. Falls back to
+    the current study list when this process no longer (or never) held that
+    version, e.g. after eviction or on another worker
+    """
+    return resolve_dataset(version)[1]
+
+def resolve_dataset(version):
+    """
+    (version, study table) as get_dataset, with the version of the table
+    actually returned: the current one after a fallback, None if there is no
+    table. Indexes over the table must be looked up by that version
+    """
+    df = dataset_cache.get(version) if version else None
+    if df is None and version and columnar.enabled:
+        # Another worker may already have written this version
+        df = columnar.load(version)
+        if df is not None:
+            dataset_cache.set(version, df)
+    if df is None and version:
+        # Another worker may already have parsed this version
+        entry = shared_cache.get('dataset:' + version)
+        if entry is not None:
+            df = entry[2]
+            dataset_cache.set(version, df)
+    if df is None:
+        version = load_dataset()
+        df = dataset_cache.get(version) if version else None
+    return (version, df) if df is not None else (None, pd.DataFrame())
+
+def sort_table(df, sort_by):
+    """
+    Apply the DataTable sort_by list to the study table. Missing values sort
+    last and ties keep table order, as in study_db.order_clause
+    """
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [col['column_id'] for col in sort_by],
+        ascending=[col['direction'] == 'asc' for col in sort_by],
+        kind='stable',
+        na_position='last'
+    )
+
+def diff_datasets(old_version, new_version):
+    """
+    Compare two cached versions of the study table. Returns the rows of the
+    new version whose tracked columns changed and the names of those columns,
+    or None when the versions cannot be patched row by row (a version is no
+    longer cached, or studies were added, removed or reordered)
+    """
+    old = dataset_cache.get(old_version)
+    new = dataset_cache.get(new_version)
+    if old is None or new is None or len(old) != len(new):
+        return None
+    if key_column not in new.columns or not old[key_column].equals(new[key_column]):
+        return None
+
+    changed = np.zeros(len(new), dtype=bool)
+    changed_columns = []
+    for col in tracked_columns:
+        if col not in new.columns or col not in old.columns:
+            continue
+        same = (old[col].to_numpy() == new[col].to_numpy()) | (old[col].isna().to_numpy() & new[col].isna().to_numpy())
+        if not same.all():
+            changed |= ~same
+            changed_columns.append(col)
+
+    return new.loc[changed], changed_columns
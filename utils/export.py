@@ -0,0 +1,153 @@
+# utils/export.py
+import os
+import json
+import zlib
+import time
+import hashlib
+import tempfile
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from utils import dataset, search, filter_query as filter_compiler
+
+# Rows written per chunk of the streamed TSV
+EXPORT_CHUNK_ROWS = int(os.environ.get('HARMSTATUS_EXPORT_CHUNK_ROWS', 10000))
+EXPORT_FILENAME = "GWAS_Catalog_harmstatus.tsv"
+
+# Directory of the saved export requests and of the export job artifacts,
+# shared by all workers
+EXPORT_DIR = os.environ.get('HARMSTATUS_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'harmstatus-exports'))
+
+# Saved export requests unused for this long are deleted
+REQUEST_TTL_SECONDS = 24 * 3600
+
+export_blueprint = Blueprint('export', __name__)
+
+def request_path(key):
+    return os.path.join(EXPORT_DIR, f'{key}.request.json')
+
+def save_request(version, filter_query='', columns=None, row_ids=None):
+    """
+    Check an export of the current table state and save it server-side, so
+    the download link carries only its key, however many rows are selected.
+    Returns the key. Raises ExportUnavailable or filter_query.FilterQueryError
+    """
+    filter_compiler.parse(filter_query or '')
+    if dataset.get_dataset(version).empty:
+        raise ExportUnavailable("Study table is not available")
+
+    state = {'version': version, 'filter_query': filter_query or '', 'columns': list(columns or []), 'row_ids': sorted(row_ids or [])}
+    key = hashlib.sha1(json.dumps(state).encode()).hexdigest()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    target = request_path(key)
+    if os.path.exists(target):
+        os.utime(target)  # Recently used: kept by prune_requests()
+    else:
+        tmp = target + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, target)
+        prune_requests()
+    return key
+
+def load_request(key):
+    """
+    A saved export request, or None if there is none under key
+    """
+    try:
+        with open(request_path(key)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def prune_requests():
+    cutoff = time.time() - REQUEST_TTL_SECONDS
+    for name in os.listdir(EXPORT_DIR):
+        if name.endswith('.request.json'):
+            try:
+                if os.path.getmtime(os.path.join(EXPORT_DIR, name)) < cutoff:
+                    os.remove(os.path.join(EXPORT_DIR, name))
+            except FileNotFoundError:
+                pass
+
+def export_url(key, gzip=False):
+    """
+    URL of the streaming TSV export of a saved request
+    """
+    return f'/export/tsv/{key}' + ('?gzip=1' if gzip else '')
+
+def iter_tsv(df, row_mask, columns):
+    """
+    Yield the TSV export chunk by chunk, so only one chunk of rows is
+    converted to text at a time
+    """
+    yield '\t'.join(columns) + '\n'
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        stop = start + EXPORT_CHUNK_ROWS
+        chunk = df.iloc[start:stop]
+        chunk = chunk.loc[row_mask[start:stop], columns]
+        if not chunk.empty:
+            yield chunk.to_csv(index=False, header=False, sep='\t')
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+class ExportUnavailable(Exception):
+    """
+    Raised when the study table of an export cannot be loaded
+    """
+
+def export_rows(version, filter_query='', row_ids=None):
+    """
+    The study table of version and the mask of the rows to export: those
+    matching the table filter, restricted to the selected rows if any.
+    Raises ExportUnavailable or filter_query.FilterQueryError
+    """
+    version, df = dataset.resolve_dataset(version)
+    if df.empty:
+        raise ExportUnavailable("Study table is not available")
+    row_mask = filter_compiler.mask(df, filter_query, search.index_for_query(version, filter_query))
+    if row_ids:
+        row_mask = row_mask & df.index.isin(row_ids)
+    return df, row_mask
+
+def export_columns(df, columns=None, hidden_columns=None):
+    """
+    Columns to export: the visible ones, in table order, or all but hidden_columns
+    """
+    selected = [col for col in columns or [] if col in df.columns]
+    if not selected:
+        hidden_columns = set(hidden_columns or [])
+        selected = [col for col in df.columns if col not in hidden_columns]
+    return selected
+
+@export_blueprint.route('/export/tsv/<key>')
+def export_tsv(key):
+    saved = load_request(key) if key.isalnum() else None
+    if saved is None:
+        abort(404, "Unknown export")
+
+    try:
+        df, row_mask = export_rows(saved['version'], saved['filter_query'], saved['row_ids'])
+    except ExportUnavailable as e:
+        abort(503, str(e))
+    except filter_compiler.FilterQueryError as e:
+        abort(400, str(e))
+    columns = export_columns(df, saved['columns'])
+
+    chunks = iter_tsv(df, row_mask, columns)
+    filename, mimetype = EXPORT_FILENAME, 'text/tab-separated-values'
+    if request.args.get('gzip') == '1':
+        chunks = iter_gzip(chunks)
+        filename, mimetype = filename + '.gz', 'application/gzip'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,233 @@
+# utils/export_jobs.py
+import os
+import json
+import zlib
+import time
+import hashlib
+import logging
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, abort, send_file
+
+from utils import export
+from utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+ipc = lazy_import('pyarrow.ipc')
+
+logger = logging.getLogger(__name__)
+
+# Export artifacts and their progress files are kept in export.EXPORT_DIR;
+# finished artifacts are reused for identical exports
+EXPORT_DIR = export.EXPORT_DIR
+EXPORT_WORKERS = int(os.environ.get('HARMSTATUS_EXPORT_WORKERS', 2))
+EXPORT_CACHE_SIZE = int(os.environ.get('HARMSTATUS_EXPORT_CACHE_SIZE', 20))
+
+# Running jobs whose progress file is older than this are considered lost
+# (e.g. their worker was restarted) and are started again
+STALE_JOB_SECONDS = 300
+
+# Output formats: file extension and whether they need pyarrow
+formats = {
+    'tsv.gz': {'label': 'TSV (gzip)', 'extension': 'tsv.gz', 'arrow': False},
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'arrow': True},
+    'arrow': {'label': 'Arrow IPC', 'extension': 'arrow', 'arrow': True},
+}
+
+export_jobs_blueprint = Blueprint('export_jobs', __name__)
+
+# Bounded pool shared by all sessions, so exports never run on request threads
+export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+# Jobs submitted by this process, to join rather than repeat a running export
+running = {}
+running_lock = threading.Lock()
+
+def available_formats():
+    """
+    Formats that can be produced here; Parquet and Arrow need the optional pyarrow
+    """
+    has_arrow = importlib.util.find_spec('pyarrow') is not None
+    return [name for name, spec in formats.items() if has_arrow or not spec['arrow']]
+
+def job_key(version, filter_query, columns, row_ids, export_format):
+    """
+    Key of an export: identical table states and formats share one artifact
+    """
+    state = json.dumps([version, filter_query or '', list(columns or []), sorted(row_ids or []), export_format])
+    return hashlib.sha1(state.encode()).hexdigest()
+
+def path(name):
+    return os.path.join(EXPORT_DIR, name)
+
+def artifact_path(key):
+    for spec in formats.values():
+        candidate = path(f"{key}.{spec['extension']}")
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def write_status(key, **status):
+    """
+    Publish a job's progress, atomically, for any worker polling it
+    """
+    tmp = path(f'.{key}.{os.getpid()}.{threading.get_ident()}.json')
+    with open(tmp, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp, path(f'{key}.json'))
+
+def status(key):
+    """
+    {'status': 'running' | 'done' | 'failed' | 'unknown', 'rows_done',
+    'rows_total', 'error'} of an export job
+    """
+    if artifact_path(key):
+        return {'status': 'done'}
+    try:
+        with open(path(f'{key}.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'status': 'unknown'}
+
+def filename(key):
+    """
+    Download name of a finished export
+    """
+    artifact = artifact_path(key)
+    return export.EXPORT_FILENAME.rsplit('.', 1)[0] + artifact[len(path(key)):] if artifact else None
+
+def submit(version, filter_query, columns, row_ids, export_format):
+    """
+    Start an export job, unless the same export is already finished or
+    running somewhere. Returns the job key
+    """
+    if export_format not in available_formats():
+        raise ValueError(f"Unsupported export format {export_format!r}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    key = job_key(version, filter_query, columns, row_ids, export_format)
+
+    with running_lock:
+        if key in running and not running[key].done():
+            return key
+        current = status(key)
+        if current['status'] == 'done':
+            os.utime(artifact_path(key))  # Recently used: kept by prune()
+            return key
+        if current['status'] == 'running' and time.time() - os.path.getmtime(path(f'{key}.json')) < STALE_JOB_SECONDS:
+            return key  # Running on another worker
+        write_status(key, status='running', rows_done=0, rows_total=None, error=None)
+        running[key] = export_pool.submit(run, key, version, filter_query, columns, row_ids, export_format)
+    return key
+
+def run(key, version, filter_query, columns, row_ids, export_format):
+    """
+    Body of an export job: select the rows and write the artifact chunk by
+    chunk, reporting progress after each chunk
+    """
+    try:
+        df, row_mask = export.export_rows(version, filter_query, row_ids)
+        columns = export.export_columns(df, columns)
+        rows_total = int(row_mask.sum())
+        write_status(key, status='running', rows_done=0, rows_total=rows_total, error=None)
+
+        target = path(f"{key}.{formats[export_format]['extension']}")
+        tmp = target + f'.{os.getpid()}.tmp'
+        writer = {'tsv.gz': write_tsv_gzip, 'parquet': write_parquet, 'arrow': write_arrow}[export_format]
+        rows_done = 0
+        for rows in writer(tmp, iter_chunks(df, row_mask, columns), df, columns):
+            rows_done += rows
+            write_status(key, status='running', rows_done=rows_done, rows_total=rows_total, error=None)
+        os.replace(tmp, target)  # Published only once complete
+        write_status(key, status='done', rows_done=rows_done, rows_total=rows_total, error=None)
+        prune(EXPORT_CACHE_SIZE)
+    except Exception as e:
+        logger.exception("Export %s failed", key)
+        write_status(key, status='failed', rows_done=0, rows_total=None, error=str(e))
+    finally:
+        with running_lock:
+            running.pop(key, None)
+
+def iter_chunks(df, row_mask, columns):
+    for start in range(0, len(df), export.EXPORT_CHUNK_ROWS):
+        stop = start + export.EXPORT_CHUNK_ROWS
+        chunk = df.iloc[start:stop].loc[row_mask[start:stop], columns]
+        if not chunk.empty:
+            yield chunk
+
+def write_tsv_gzip(target, chunks, df, columns):
+    with open(target, 'wb') as f:
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        f.write(compressor.compress(('\t'.join(columns) + '\n').encode()))
+        for chunk in chunks:
+            f.write(compressor.compress(chunk.to_csv(index=False, header=False, sep='\t').encode()))
+            yield len(chunk)
+        f.write(compressor.flush())
+
+def arrow_schema(df, columns):
+    """
+    Arrow schema of the export, fixed up front so every chunk converts alike:
+    Categoricals stay dictionary-encoded, text columns are strings even in
+    chunks where they are all missing
+    """
+    fields = []
+    for col in columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = pa.array(series.cat.categories.to_numpy()).type if len(series.cat.categories) else pa.string()
+            kind = pa.dictionary(pa.int32(), values)
+        elif series.dtype == object:
+            sample = series.dropna().head(1000)
+            kind = pa.array(sample.to_numpy()).type if len(sample) else pa.string()
+        else:
+            kind = pa.Schema.from_pandas(series.iloc[:0].to_frame(), preserve_index=False).field(col).type
+        fields.append(pa.field(col, kind))
+    return pa.schema(fields)
+
+def write_parquet(target, chunks, df, columns):
+    schema = arrow_schema(df, columns)
+    with pq.ParquetWriter(target, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield len(chunk)
+
+def write_arrow(target, chunks, df, columns):
+    schema = arrow_schema(df, columns)
+    with pa.OSFile(target, 'wb') as sink, ipc.new_file(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield len(chunk)
+
+def prune(keep):
+    """
+    Delete all but the keep most recently used artifacts, with their progress files
+    """
+    artifacts = [
+        name for name in os.listdir(EXPORT_DIR)
+        if not name.startswith('.') and not name.endswith(('.json', '.tmp'))
+    ]
+    artifacts.sort(key=lambda name: os.path.getmtime(path(name)), reverse=True)
+    for name in artifacts[keep:]:
+        for stale in (name, name.split('.', 1)[0] + '.json'):
+            try:
+                os.remove(path(stale))
+            except FileNotFoundError:
+                pass
+
+@export_jobs_blueprint.route('/export/jobs/<key>')
+def download_artifact(key):
+    """
+    Serve a finished export artifact
+    """
+    if not key.isalnum():
+        abort(404)
+    artifact = artifact_path(key)
+    if artifact is None:
+        abort(404, "Export is not ready")
+    return send_file(artifact, as_attachment=True, download_name=filename(key))
+
+def download_url(key):
+    return f'/export/jobs/{key}'
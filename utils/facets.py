@@ -0,0 +1,117 @@
+# utils/facets.py
+import operator
+
+from utils import dataset, metrics, shared_cache
+from utils.cache import TTLCache
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Define special handling for specific column types
+text_input_columns = ['PMID', 'First_author']
+comparison_columns = [
+    'Raw_N_variants',
+    'Harm_drop_rate',
+    'Liftover_drop_rate'
+]
+dropdown_columns = [
+    'Effect_size_type',
+    'Raw_genome_build',
+    'Raw_coordinate_system',
+    'Harm_status',
+    'Harm_account',
+    'Harm_exitcode',
+    'Harm_failstep'
+]
+
+# Comparison operators of the filter panel
+comparison_functions = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '==': operator.eq,
+}
+
+class FacetIndex:
+    """
+    Facets of one dataset version: integer codes, sorted values and counts
+    for the dropdown columns, plus numeric arrays and min/max for the
+    comparison columns
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.codes, self.values, self.counts = {}, {}, {}
+        for col in dropdown_columns:
+            if col not in df.columns:
+                continue
+            # Values as the strings shown in the dropdown; missing values get code -1
+            codes, uniques = pd.factorize(df[col].map(str, na_action='ignore'), sort=True)
+            self.codes[col] = codes
+            self.values[col] = list(uniques)
+            self.counts[col] = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+        self.numbers, self.ranges = {}, {}
+        for col in comparison_columns:
+            if col not in df.columns:
+                continue
+            numbers = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            self.numbers[col] = numbers
+            if np.isfinite(numbers).any():
+                self.ranges[col] = (np.nanmin(numbers), np.nanmax(numbers))
+
+    def selection_mask(self, selections, comparisons, exclude=None):
+        """
+        Rows matching the dropdown selections ({column: [values]}) and numeric
+        comparisons ({column: (operator, value)}), ignoring the column exclude
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for col, selected in selections.items():
+            if col == exclude or not selected or col not in self.codes:
+                continue
+            lookup = {value: code for code, value in enumerate(self.values[col])}
+            selected_codes = [lookup[value] for value in selected if value in lookup]
+            mask &= np.isin(self.codes[col], selected_codes)
+        for col, (operator, value) in comparisons.items():
+            if col == exclude or col not in self.numbers or operator not in comparison_functions:
+                continue
+            with np.errstate(invalid='ignore'):
+                mask &= comparison_functions[operator](self.numbers[col], value)
+        return mask
+
+    def value_counts(self, col, mask=None):
+        """
+        Count of each value of a dropdown column among the masked rows
+        """
+        if mask is None or mask.all():
+            return self.counts[col]
+        codes = self.codes[col][mask]
+        return np.bincount(codes[codes >= 0], minlength=len(self.values[col]))
+
+    def options(self, col, mask=None):
+        """
+        Dropdown options labelled with their row counts
+        """
+        counts = self.value_counts(col, mask)
+        return [
+            {'label': f"{value} ({count})", 'value': value}
+            for value, count in zip(self.values[col], counts)
+        ]
+
+# Facet indexes per dataset version
+facet_cache = TTLCache(maxsize=dataset.dataset_cache.maxsize, name='facets')
+
+def get_facets(version):
+    """
+    Return the facet index of a dataset version, building it on first use
+    """
+    facets = facet_cache.get(version)
+    if facets is None:
+        version, df = dataset.resolve_dataset(version)
+        if version is None:
+            return FacetIndex(df)  # No study table
+        with metrics.timed(metrics.stage_seconds, stage='facets'):
+            facets = shared_cache.get_or_build('facets:' + version, lambda: FacetIndex(df), version=version)
+        shared_cache.prune('facets:', keep=facet_cache.maxsize)
+        facet_cache.set(version, facets)
+    return facets
@@ -0,0 +1,369 @@
+# utils/filter_query.py
+import re
+from functools import lru_cache
+
+from utils import schema
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Tokens of the DataTable filter_query grammar
+token_pattern = re.compile(r'''
+    \s*(?:
+        (?P<column>\{[^}]*\})
+      | (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)
+      | (?P<symbol>&&|\|\||>=|<=|!=|=|>|<|!|\(|\))
+      | (?P<word>[^\s(){}"'`!=<>&|]+)
+    )''', re.VERBOSE)
+
+# Comparison operators and their canonical names
+comparison_operators = {
+    'eq': 'eq', '=': 'eq',
+    'ne': 'ne', '!=': 'ne',
+    'gt': 'gt', '>': 'gt',
+    'ge': 'ge', '>=': 'ge',
+    'lt': 'lt', '<': 'lt',
+    'le': 'le', '<=': 'le',
+    'contains': 'contains',
+    'icontains': 'icontains',
+    'datestartswith': 'datestartswith',
+}
+
+# Values treated as a missing-value literal (e.g. "{col} != NA")
+missing_literals = {'NA', 'NaN', 'nan', 'null', 'None'}
+
+class FilterQueryError(ValueError):
+    """
+    Raised when a filter_query string cannot be parsed
+    """
+
+def tokenize(query):
+    tokens, pos = [], 0
+    query = query.rstrip()
+    while pos < len(query):
+        match = token_pattern.match(query, pos)
+        if not match or match.end() == pos:
+            raise FilterQueryError(f"Unexpected input at position {pos}: {query[pos:]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'word' and text.lower() in ('and', 'or', 'not'):
+            kind, text = 'symbol', {'and': '&&', 'or': '||', 'not': '!'}[text.lower()]
+        tokens.append((kind, text))
+        pos = match.end()
+    return tokens
+
+class Parser:
+    """
+    Recursive-descent parser turning filter_query tokens into a nested tuple
+    tree: ('or', a, b), ('and', a, b), ('not', a) or ('cmp', column, op, value)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            return None
+        tree = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise FilterQueryError(f"Unexpected token {self.peek()[1]!r}")
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == ('symbol', '||'):
+            self.take()
+            tree = ('or', tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_unary()
+        while self.peek() == ('symbol', '&&'):
+            self.take()
+            tree = ('and', tree, self.parse_unary())
+        return tree
+
+    def parse_unary(self):
+        kind, text = self.peek()
+        if (kind, text) == ('symbol', '!'):
+            self.take()
+            return ('not', self.parse_unary())
+        if (kind, text) == ('symbol', '('):
+            self.take()
+            tree = self.parse_or()
+            if self.take() != ('symbol', ')'):
+                raise FilterQueryError("Missing closing parenthesis")
+            return tree
+        if kind == 'column':
+            return self.parse_comparison()
+        raise FilterQueryError(f"Expected a condition, got {text!r}")
+
+    def parse_comparison(self):
+        column = self.take()[1][1:-1]
+        kind, text = self.take()
+
+        # Unary operators: "is nil", "is not nil", "is blank", ...
+        if kind == 'word' and text == 'is':
+            negate = self.peek() == ('symbol', '!')
+            if negate:
+                self.take()
+            kind, text = self.take()
+            if text not in ('nil', 'blank', 'num', 'str', 'bool'):
+                raise FilterQueryError(f"Unknown operator 'is {text}'")
+            tree = ('cmp', column, 'is ' + text, None)
+            return ('not', tree) if negate else tree
+
+        op = comparison_operators.get(text.lower() if text else text)
+        if op is None:
+            raise FilterQueryError(f"Unknown operator {text!r}")
+
+        kind, text = self.take()
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', text[1:-1])
+        elif kind == 'word':
+            try:
+                value = float(text)
+            except ValueError:
+                value = text
+        else:
+            raise FilterQueryError(f"Expected a value after {column} {op}")
+        return ('cmp', column, op, value)
+
+def escape(value):
+    """
+    A value escaped for a double-quoted filter_query string
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+@lru_cache(maxsize=256)
+def parse(query):
+    """
+    Parse a filter_query string into a condition tree (None for an empty query)
+    """
+    return Parser(tokenize(query or '')).parse()
+
+def as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def as_text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def as_timestamp(value):
+    """
+    Timestamp a value compared with a datetime column stands for (e.g. 2023
+    is 2023-01-01), or NaT if it is not a date
+    """
+    return pd.to_datetime(as_text(value), errors='coerce')
+
+def compare(df, column, op, value, search=None):
+    """
+    Boolean mask for a single condition. Substring conditions on columns
+    covered by the search index are answered from the index
+    """
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    if op in ('contains', 'icontains') and search is not None and getattr(search, 'rows', None) == len(df) and search.covers(column):
+        return search.mask(column, as_text(value), case=op == 'contains')
+
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Dictionary-encoded column: compare each distinct value once and map
+        # the result through the codes (code -1, missing, takes the last slot)
+        values = pd.DataFrame({column: pd.Series([*series.cat.categories, None], dtype=object)})
+        return compare(values, column, op, value)[series.cat.codes.to_numpy()]
+    missing = series.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Datetimes: ordering against a parseable date compares timestamps,
+        # anything else compares the ISO text the table shows
+        target = as_timestamp(value) if op in ('eq', 'ne', 'gt', 'ge', 'lt', 'le') else pd.NaT
+        if pd.isna(target) or (series.dt.tz is None) != (target.tz is None):
+            series = schema.date_text(series)
+        else:
+            mask = getattr(series, f'__{op}__')(target).to_numpy(dtype=bool)
+            return mask & ~missing if op != 'ne' else mask | missing
+
+    if op == 'is nil':
+        return missing
+    if op == 'is blank':
+        return missing | (series.astype(str).str.strip() == '').to_numpy()
+    if op in ('is num', 'is str', 'is bool'):
+        kinds = {'is num': (int, float, np.number), 'is str': str, 'is bool': (bool, np.bool_)}[op]
+        if op == 'is num' and pd.api.types.is_numeric_dtype(series):
+            return ~missing
+        return series.map(lambda v: isinstance(v, kinds)).to_numpy(dtype=bool)
+
+    if isinstance(value, str) and value in missing_literals and op in ('eq', 'ne'):
+        return missing if op == 'eq' else ~missing
+
+    if op in ('contains', 'icontains', 'datestartswith'):
+        text = series.astype(str)
+        if op == 'contains':
+            mask = text.str.contains(as_text(value), regex=False)
+        elif op == 'icontains':
+            mask = text.str.lower().str.contains(as_text(value).lower(), regex=False)
+        else:
+            mask = text.str.startswith(as_text(value))
+        return mask.to_numpy(dtype=bool) & ~missing
+
+    # eq/ne/gt/ge/lt/le: numeric comparison when the column or value is numeric,
+    # string comparison otherwise
+    number = as_number(value)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        target = number
+    elif isinstance(value, float) and op not in ('eq', 'ne'):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+        target = number
+    else:
+        values = series.astype(str).to_numpy()
+        target = as_text(value)
+
+    with np.errstate(invalid='ignore'):
+        mask = getattr(pd.Series(values, copy=False), f'__{op}__')(target).to_numpy(dtype=bool)
+    return mask & ~missing if op != 'ne' else mask | missing
+
+def evaluate(df, tree, search=None):
+    kind = tree[0]
+    if kind == 'and':
+        return evaluate(df, tree[1], search) & evaluate(df, tree[2], search)
+    if kind == 'or':
+        return evaluate(df, tree[1], search) | evaluate(df, tree[2], search)
+    if kind == 'not':
+        return ~evaluate(df, tree[1], search)
+    return compare(df, *tree[1:], search=search)
+
+def mask(df, query, search=None):
+    """
+    Compile a filter_query string into one boolean NumPy mask over df.
+    search is an optional utils.search.SearchIndex built from df
+    """
+    tree = parse(query)
+    if tree is None:
+        return np.ones(len(df), dtype=bool)
+    return evaluate(df, tree, search)
+
+def apply(df, query, search=None):
+    """
+    Return the rows of df matching a filter_query string
+    """
+    if not query or not query.strip():
+        return df
+    return df.loc[mask(df, query, search)]
+
+# SQL comparison operators for eq/ne/gt/ge/lt/le
+sql_operators = {'eq': '=', 'ne': '!=', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<='}
+
+# Declared SQL type of datetime columns, stored as ISO text (TEXT affinity)
+sql_datetime_type = 'DATETIME_TEXT'
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def sql_compare(column, op, value, column_types, search_table=None):
+    """
+    SQLite condition and parameters for a single condition. column_types maps
+    the table's columns to their declared type ('REAL', 'INTEGER', 'TEXT' or
+    sql_datetime_type).
+    search_table is an optional FTS5 trigram table over some of the columns,
+    keyed by row_id, used for substring conditions of 3+ characters
+    """
+    if column not in column_types:
+        return '0', []
+    col = quote_identifier(column)
+    numeric = column_types[column] in ('REAL', 'INTEGER')
+
+    if op == 'is nil':
+        return f'{col} IS NULL', []
+    if op == 'is blank':
+        return f"({col} IS NULL OR trim({col}) = '')", []
+    if op in ('is num', 'is str', 'is bool'):
+        kinds = {'is num': "('integer', 'real')", 'is str': "('text')", 'is bool': "('integer')"}[op]
+        return f'typeof({col}) IN {kinds}', []
+
+    if isinstance(value, str) and value in missing_literals and op in ('eq', 'ne'):
+        return f'{col} IS {"" if op == "eq" else "NOT "}NULL', []
+
+    if op in ('contains', 'icontains') and search_table and column in search_table[1] and len(as_text(value)) >= 3:
+        # Candidate rows from the trigram index (case-insensitive), confirmed below
+        table = quote_identifier(search_table[0])
+        indexed = f'row_id IN (SELECT rowid FROM {table} WHERE {col} MATCH ?)'
+        if op == 'icontains':
+            return indexed, [fts_phrase(as_text(value))]
+        return f'({indexed} AND instr({col}, ?) > 0)', [fts_phrase(as_text(value)), as_text(value)]
+    if op == 'contains':
+        return f'instr({col}, ?) > 0', [as_text(value)]
+    if op == 'icontains':
+        return f'instr(lower({col}), ?) > 0', [as_text(value).lower()]
+    if op == 'datestartswith':
+        text = as_text(value)
+        return f'substr({col}, 1, ?) = ?', [len(text), text]
+
+    # Datetimes: ordering against a parseable date compares timestamps, as in
+    # compare(); anything else compares the ISO text
+    if column_types[column] == sql_datetime_type:
+        target = as_timestamp(value)
+        if not pd.isna(target) and target.tz is None:
+            condition = f'julianday({col}) {sql_operators[op]} julianday(?)'
+            if op == 'ne':
+                condition = f'({condition} OR {col} IS NULL)'
+            return condition, [target.isoformat(sep=' ')]
+        if isinstance(value, float) and op not in ('eq', 'ne'):
+            return '0', []  # ISO text is never a number
+
+    # Numeric comparison when the column or value is numeric, text otherwise
+    if numeric:
+        number = as_number(value)
+        if np.isnan(number):
+            return ('1' if op == 'ne' else '0'), []
+        target, expression = number, col
+    elif isinstance(value, float) and op not in ('eq', 'ne'):
+        target, expression = value, f'CAST({col} AS REAL)'
+    else:
+        target, expression = as_text(value), col
+
+    condition = f'{expression} {sql_operators[op]} ?'
+    if op == 'ne':
+        condition = f'({condition} OR {col} IS NULL)'
+    return condition, [target]
+
+def sql_evaluate(tree, column_types, search_table=None):
+    kind = tree[0]
+    if kind in ('and', 'or'):
+        left, left_params = sql_evaluate(tree[1], column_types, search_table)
+        right, right_params = sql_evaluate(tree[2], column_types, search_table)
+        return f'({left} {kind.upper()} {right})', left_params + right_params
+    if kind == 'not':
+        condition, params = sql_evaluate(tree[1], column_types, search_table)
+        # A condition on NULL is NULL in SQL but False in the pandas mask, so
+        # its negation must be True, as ~mask gives
+        return f'(NOT IFNULL({condition}, 0))', params
+    return sql_compare(*tree[1:], column_types, search_table)
+
+def to_sql(query, column_types, search_table=None):
+    """
+    Compile a filter_query string into an SQLite WHERE clause and its
+    parameters. search_table is (FTS5 table name, indexed columns) or None
+    """
+    tree = parse(query)
+    if tree is None:
+        return '1', []
+    return sql_evaluate(tree, column_types, search_table)
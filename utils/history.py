@@ -0,0 +1,177 @@
+# utils/history.py
+import os
+import time
+import fcntl
+from contextlib import contextmanager
+
+from utils import aggregates
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Directory of the append-only history store; unset disables it
+HISTORY_DIR = os.environ.get('HARMSTATUS_HISTORY_DIR')
+
+enabled = bool(HISTORY_DIR)
+
+# Fixed-size records of the column files. Status counts are stored for every
+# recorded version; drop rates only for studies whose rate changed, so a
+# study's rate at time t is its last record at or before t
+status_record = [('time', '<f8'), ('status', '<i4'), ('count', '<i4')]
+drop_rate_record = [('time', '<f8'), ('study', '<i4'), ('rate', '<f4')]
+
+def path(name):
+    return os.path.join(HISTORY_DIR, name)
+
+@contextmanager
+def write_lock():
+    """
+    Exclusive lock on the store, shared by every worker process
+    """
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    with open(path('history.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def read_lines(name):
+    try:
+        with open(path(name), encoding='utf-8') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+def read_records(name, record):
+    """
+    Memory-mapped records of a column file; a partly written last record is ignored
+    """
+    dtype = np.dtype(record)
+    try:
+        count = os.path.getsize(path(name)) // dtype.itemsize
+    except FileNotFoundError:
+        count = 0
+    if not count:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path(name), dtype=dtype, mode='r', shape=(count,))
+
+def append_records(name, records):
+    with open(path(name), 'ab') as f:
+        f.write(records.tobytes())
+
+def encode(name, values):
+    """
+    Integer codes of values in the append-only dictionary file name, adding new values
+    """
+    known = {value: code for code, value in enumerate(read_lines(name))}
+    new = [value for value in dict.fromkeys(values) if value not in known]
+    if new:
+        with open(path(name), 'a', encoding='utf-8') as f:
+            f.write(''.join(value.replace('\n', ' ') + '\n' for value in new))
+        known.update(zip(new, range(len(known), len(known) + len(new))))
+    return np.array([known[value] for value in values], dtype=np.int32)
+
+def last_drop_rates():
+    """
+    {study code: latest recorded drop rate}
+    """
+    records = read_records('drop_rates.bin', drop_rate_record)
+    if not len(records):
+        return {}
+    # Records are in time order, so the last occurrence of a study is its latest rate
+    studies = records['study'][::-1]
+    codes, first = np.unique(studies, return_index=True)
+    return dict(zip(codes.tolist(), records['rate'][::-1][first].tolist()))
+
+def record(version, df, now=None):
+    """
+    Append the status counts and changed drop rates of a dataset version.
+    Each version is recorded once, whichever worker loads it first, so
+    workers still serving an older version do not record it again
+    """
+    if not enabled or df.empty:
+        return
+    now = time.time() if now is None else now
+    with write_lock():
+        if version in {line.split('\t')[1] for line in read_lines('versions.txt')}:
+            return
+
+        counts = aggregates.status_counts(df)
+        statuses = np.zeros(len(counts), dtype=status_record)
+        statuses['time'] = now
+        statuses['status'] = encode('statuses.txt', counts['Harm_status'].tolist())
+        statuses['count'] = counts['num_unique_studies'].to_numpy()
+        append_records('status_counts.bin', statuses)
+
+        studies = encode('studies.txt', df['Study'].astype(str).tolist())
+        rates = pd.to_numeric(df['Harm_drop_rate'], errors='coerce').to_numpy(dtype=np.float32)
+        previous = last_drop_rates()
+        old = np.array([previous.get(code, np.inf) for code in studies.tolist()], dtype=np.float32)
+        changed = ~((old == rates) | (np.isnan(old) & np.isnan(rates)))
+        drop_rates = np.zeros(int(changed.sum()), dtype=drop_rate_record)
+        drop_rates['time'] = now
+        drop_rates['study'] = studies[changed]
+        drop_rates['rate'] = rates[changed]
+        append_records('drop_rates.bin', drop_rates)
+
+        # Written last: a version is only marked recorded once its data is
+        with open(path('versions.txt'), 'a', encoding='utf-8') as f:
+            f.write(f"{now}\t{version}\n")
+
+def revision():
+    """
+    Number of recorded versions, to detect new history cheaply
+    """
+    return len(read_lines('versions.txt')) if enabled else 0
+
+def status_history(start=None, end=None):
+    """
+    Status counts recorded between start and end (epoch seconds) as a
+    DataFrame(time, Harm_status, num_unique_studies). The counts in effect
+    at start are included, dated start
+    """
+    records = read_records('status_counts.bin', status_record)
+    times = records['time']
+    first = 0 if start is None else np.searchsorted(times, start, side='right')
+    last = len(records) if end is None else np.searchsorted(times, end, side='right')
+    if first > 0:
+        first = np.searchsorted(times, times[first - 1], side='left')  # Start of the previous snapshot
+    selected = np.array(records[first:last])
+    if start is not None:
+        selected['time'] = np.maximum(selected['time'], start)
+
+    names = np.array(read_lines('statuses.txt') or [''], dtype=object)
+    return pd.DataFrame({
+        'time': pd.to_datetime(selected['time'], unit='s'),
+        'Harm_status': names[selected['status']],
+        'num_unique_studies': selected['count'],
+    })
+
+def drop_rate_history(studies, start=None, end=None):
+    """
+    Recorded drop rates of the given studies between start and end (epoch
+    seconds) as a DataFrame(time, Study, Harm_drop_rate). The rate of each
+    study in effect at start is included, dated start
+    """
+    records = read_records('drop_rates.bin', drop_rate_record)
+    names = read_lines('studies.txt')
+    wanted = set(studies)
+    codes = [code for code, name in enumerate(names) if name in wanted]
+    times = records['time']
+    last = len(records) if end is None else np.searchsorted(times, end, side='right')
+    selected = np.array(records[:last])
+    selected = selected[np.isin(selected['study'], codes)]
+    if start is not None:
+        # Only rate changes are stored: keep each study's last record before start
+        before = selected['time'] <= start
+        earlier = selected[before][::-1]
+        _, latest = np.unique(earlier['study'], return_index=True)
+        selected = np.concatenate([earlier[latest], selected[~before]])
+        selected['time'] = np.maximum(selected['time'], start)
+    return pd.DataFrame({
+        'time': pd.to_datetime(selected['time'], unit='s'),
+        'Study': np.array(names or [''], dtype=object)[selected['study']],
+        'Harm_drop_rate': selected['rate'],
+    })
@@ -0,0 +1,18 @@
+# utils/lazy.py
+import importlib
+import types
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported on first attribute access,
+    so heavy libraries are not loaded while a worker starts up
+    """
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+def lazy_import(name):
+    """
+    Return a LazyModule for name, e.g. pd = lazy_import('pandas')
+    """
+    return LazyModule(name)
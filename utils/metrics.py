@@ -0,0 +1,159 @@
+# utils/metrics.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from flask import g, request
+
+from utils.cache import cache_stats
+
+logger = logging.getLogger(__name__)
+
+# Callbacks slower than this many seconds are logged; unset disables the log
+SLOW_CALLBACK_SECONDS = os.environ.get('HARMSTATUS_SLOW_CALLBACK_SECONDS')
+
+# Histogram bucket bounds
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+size_buckets = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MiB
+
+# Every histogram, in the order they are rendered
+histograms = []
+
+class Histogram:
+    """
+    Thread-safe Prometheus-style histogram with one series per label set
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values: [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        histograms.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = list(zip(self.labels, key))
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts + [count]):
+                lines.append(f"{self.name}_bucket{label_text(labels + [('le', str(bound))])} {bucket_count}")
+            lines.append(f"{self.name}_sum{label_text(labels)} {total}")
+            lines.append(f"{self.name}_count{label_text(labels)} {count}")
+        return lines
+
+def label_text(labels):
+    """
+    Prometheus label set for [(label, value)] pairs, e.g. {route="plotly/status_bar"}
+    """
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+callback_seconds = Histogram(
+    'harmstatus_callback_seconds', "Wall time of Dash callback requests, including serialization",
+    ('callback',), latency_buckets
+)
+callback_request_bytes = Histogram(
+    'harmstatus_callback_request_bytes', "Size of Dash callback request bodies", ('callback',), size_buckets
+)
+callback_response_bytes = Histogram(
+    'harmstatus_callback_response_bytes', "Size of Dash callback responses", ('callback',), size_buckets
+)
+backend_fetch_seconds = Histogram(
+    'harmstatus_backend_fetch_seconds', "Latency of backend requests, including JSON decoding",
+    ('route',), latency_buckets
+)
+stage_seconds = Histogram(
+    'harmstatus_stage_seconds', "Time spent in each processing stage of the callbacks",
+    ('stage',), latency_buckets
+)
+
+@contextmanager
+def timed(histogram, **labels):
+    """
+    Observe the wall time of the with block in histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def callback_name(app, body):
+    """
+    Name of the callback function answering a /_dash-update-component request
+    """
+    output = (body or {}).get('output', '')
+    func = app.callback_map.get(output, {}).get('callback')
+    return getattr(func, '__name__', None) or output
+
+def instrument(app):
+    """
+    Time every callback request of a Dash app and record its payload sizes
+    """
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        if request.path.endswith('/_dash-update-component'):
+            g.callback_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        start = g.pop('callback_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        body = request.get_json(silent=True)
+        name = callback_name(app, body)
+        request_size = request.content_length or 0
+        response_size = response.calculate_content_length() or 0
+
+        callback_seconds.observe(elapsed, callback=name)
+        callback_request_bytes.observe(request_size, callback=name)
+        callback_response_bytes.observe(response_size, callback=name)
+        if SLOW_CALLBACK_SECONDS and elapsed > float(SLOW_CALLBACK_SECONDS):
+            logger.warning(
+                "Slow callback %s: %.3fs, request %d B, response %d B, triggered by %s",
+                name, elapsed, request_size, response_size, json.dumps((body or {}).get('changedPropIds'))
+            )
+        return response
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for histogram in histograms:
+        lines += histogram.render()
+
+    caches = cache_stats()
+    for metric, key, kind, documentation in [
+        ('harmstatus_cache_hits_total', 'hits', 'counter', "Cache lookups served from the cache"),
+        ('harmstatus_cache_misses_total', 'misses', 'counter', "Cache lookups that missed"),
+        ('harmstatus_cache_hit_ratio', 'hit_rate', 'gauge', "Share of cache lookups that hit"),
+        ('harmstatus_cache_entries', 'size', 'gauge', "Entries held by the cache"),
+    ]:
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+        for name, stats in sorted(caches.items()):
+            if stats.get(key) is not None:
+                lines.append(f"{metric}{label_text([('cache', name)])} {stats[key]}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,82 @@
+# utils/refresher.py
+import os
+import time
+import logging
+import threading
+
+from utils import backend, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background refreshes
+REFRESH_SECONDS = float(os.environ.get('HARMSTATUS_REFRESH_SECONDS', 60))
+
+# Functions called on every refresh to re-fetch backend routes and rebuild
+# derived structures; pages register theirs with register()
+warmers = []
+
+stop_event = threading.Event()
+worker = None
+
+# Outcome of the most recent refresh, for monitoring
+last_refresh = {'started': None, 'finished': None, 'errors': {}}
+
+def register(func):
+    """
+    Register a warmer, called with no arguments on every refresh. Usable as a decorator
+    """
+    warmers.append(func)
+    return func
+
+def refresh_once():
+    """
+    Run every warmer once. A failing warmer is logged and does not stop the
+    others. With the shared cache, only the worker holding the refresher
+    lease refreshes; the others read what it publishes. The lease belongs to
+    the process rather than to the thread refreshing
+    """
+    if not shared_cache.acquire('refresher', REFRESH_SECONDS * 2, owner=shared_cache.process_id()):
+        return
+    last_refresh['started'] = time.time()
+    errors = {}
+    for func in warmers:
+        try:
+            func()
+        except Exception as e:  # Keep serving the previous snapshot
+            logger.exception("Background refresh %s failed", func.__name__)
+            errors[func.__name__] = str(e)
+    last_refresh['finished'] = time.time()
+    last_refresh['errors'] = errors
+
+def in_refresh():
+    """
+    True when called from the refresher thread
+    """
+    return worker is not None and threading.current_thread() is worker
+
+def run():
+    # Until the first refresh is done, requests fetch on demand as usual
+    refresh_once()
+    if not stop_event.is_set():
+        backend.serve_snapshots = True
+    while not stop_event.wait(REFRESH_SECONDS):
+        refresh_once()
+
+def start():
+    """
+    Warm the caches, then keep refreshing them, in a daemon thread, so worker
+    boot does not wait for a refresh. Once warm, callbacks are served the
+    latest snapshot instead of fetching
+    """
+    global worker
+    if worker is not None and worker.is_alive():
+        return worker
+
+    stop_event.clear()
+    worker = threading.Thread(target=run, name="harmstatus-refresher", daemon=True)
+    worker.start()
+    return worker
+
+def stop():
+    stop_event.set()
+    backend.serve_snapshots = False
@@ -0,0 +1,55 @@
+# utils/schema.py
+from utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# Ingestion schema of the backend records: the type of each known column of
+# the study list and of the summary endpoints. Other columns stay text
+numeric_columns = [
+    'Raw_N_variants', 'Harm_drop_rate', 'Liftover_drop_rate',
+    'year', 'num_studies', 'num_unique_studies'
+]
+datetime_columns = ['Latest_harm_start_date']
+
+# Low-cardinality text columns, held as Categoricals (one code per row)
+categorical_columns = [
+    'Harm_status',
+    'Genotyping_type',
+    'Effect_size_type',
+    'Raw_genome_build',
+    'Raw_coordinate_system',
+    'Harm_account',
+    'Harm_exitcode',
+    'Harm_failstep'
+]
+
+def apply(df):
+    """
+    Cast the known columns of a frame of backend records to their schema
+    types, in place. Unparseable numbers and dates become missing values
+    """
+    for col in df.columns.intersection(numeric_columns):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in df.columns.intersection(datetime_columns):
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='ISO8601')
+    for col in df.columns.intersection(categorical_columns):
+        df[col] = df[col].astype('category')
+    return df
+
+def date_text(series):
+    """
+    ISO text of a datetime column (dates only when no value has a time), None
+    where missing
+    """
+    return series.astype(str).where(series.notna(), None)
+
+def with_text_dates(df):
+    """
+    The frame with its datetime columns as ISO text, as shown in the table
+    and stored in the study database
+    """
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    if not dates:
+        return df
+    return df.assign(**{col: date_text(df[col]) for col in dates})
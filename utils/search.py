@@ -0,0 +1,137 @@
+# utils/search.py
+from utils import dataset, metrics, shared_cache
+from utils.cache import TTLCache
+from utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Shortest substring answered from the trigram index; shorter ones scan the
+# column's distinct values
+MIN_INDEXED_LENGTH = 3
+
+def trigram_codes(matrix, lengths):
+    """
+    (trigram code, value id) pairs of every trigram of the byte rows of matrix
+    """
+    grams, ids = [], []
+    rows = np.arange(len(matrix), dtype=np.int64)
+    for start in range(matrix.shape[1] - 2):
+        valid = lengths >= start + 3
+        window = matrix[valid, start:start + 3].astype(np.int64)
+        grams.append((window[:, 0] << 16) | (window[:, 1] << 8) | window[:, 2])
+        ids.append(rows[valid])
+    if not grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(grams), np.concatenate(ids)
+
+class ColumnSearch:
+    """
+    Trigram index over the distinct values of one column. Values are
+    dictionary-encoded, and every lower-cased UTF-8 trigram maps to the sorted
+    ids of the values containing it, so a substring query intersects a few
+    posting lists instead of scanning every row
+    """
+
+    def __init__(self, series):
+        # Values as the strings the filter compares; missing values get code -1
+        self.codes, values = pd.factorize(series.map(str, na_action='ignore'))
+        self.values = np.asarray(values, dtype=object)
+
+        encoded = np.array([value.lower().encode() for value in self.values] or [b''], dtype=bytes)
+        matrix = encoded.view(np.uint8).reshape(len(encoded), encoded.dtype.itemsize)
+        lengths = np.char.str_len(encoded)
+        grams, ids = trigram_codes(matrix[:len(self.values)], lengths[:len(self.values)])
+
+        # Posting lists: value ids grouped by trigram, each group sorted
+        order = np.lexsort((ids, grams))
+        grams, self.postings = grams[order], ids[order].astype(np.int32)
+        self.grams, starts = np.unique(grams, return_index=True)
+        self.starts = np.append(starts, len(grams))
+
+    def candidates(self, needle):
+        """
+        Ids of the values containing every trigram of the lower-cased needle
+        """
+        data = np.frombuffer(needle.lower().encode(), dtype=np.uint8).astype(np.int64)
+        grams = np.unique((data[:-2] << 16) | (data[1:-1] << 8) | data[2:])
+        positions = np.searchsorted(self.grams, grams)
+        if (positions >= len(self.grams)).any() or (self.grams[positions] != grams).any():
+            return np.empty(0, dtype=np.int32)
+
+        lists = sorted((self.postings[self.starts[p]:self.starts[p + 1]] for p in positions), key=len)
+        found = lists[0]
+        for postings in lists[1:]:
+            found = np.intersect1d(found, postings, assume_unique=True)
+            if not len(found):
+                break
+        return found
+
+    def matching_values(self, needle, case=True):
+        """
+        Ids of the distinct values containing needle as a substring
+        """
+        if len(needle.encode()) >= MIN_INDEXED_LENGTH:
+            ids = self.candidates(needle)
+        else:
+            ids = np.arange(len(self.values))
+
+        # Trigrams may occur apart or in another case; confirm on the candidates
+        if case:
+            keep = [needle in value for value in self.values[ids]]
+        else:
+            lowered = needle.lower()
+            keep = [lowered in value.lower() for value in self.values[ids]]
+        return ids[np.asarray(keep, dtype=bool)] if len(ids) else ids
+
+    def mask(self, needle, case=True):
+        """
+        Boolean row mask of the rows whose value contains needle
+        """
+        selected = np.zeros(len(self.values) + 1, dtype=bool)  # Last slot: missing values
+        selected[self.matching_values(needle, case)] = True
+        return selected[self.codes]
+
+class SearchIndex:
+    """
+    Substring search over the search columns of one dataset version
+    """
+
+    def __init__(self, df):
+        self.rows = len(df)
+        self.columns = {col: ColumnSearch(df[col]) for col in dataset.search_columns if col in df.columns}
+
+    def covers(self, column):
+        return column in self.columns
+
+    def mask(self, column, needle, case=True):
+        return self.columns[column].mask(needle, case)
+
+# Search indexes per dataset version
+search_cache = TTLCache(maxsize=dataset.dataset_cache.maxsize, name='search')
+
+def get_search_index(version):
+    """
+    Return the search index of a dataset version, building it on first use.
+    version must be one resolved by dataset.resolve_dataset, so the index
+    matches the table it is used on
+    """
+    index = search_cache.get(version)
+    if index is None:
+        version, df = dataset.resolve_dataset(version)
+        if version is None:
+            return SearchIndex(df)  # No study table
+        with metrics.timed(metrics.stage_seconds, stage='search_index'):
+            index = shared_cache.get_or_build('search:' + version, lambda: SearchIndex(df), version=version)
+        shared_cache.prune('search:', keep=search_cache.maxsize)
+        search_cache.set(version, index)
+    return index
+
+def index_for_query(version, filter_query):
+    """
+    Search index for evaluating filter_query, or None if the query has no
+    substring conditions (so the index is not built for nothing)
+    """
+    if 'contains' not in (filter_query or ''):
+        return None
+    return get_search_index(version)
@@ -0,0 +1,151 @@
+# utils/shared_cache.py
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+# SQLite file shared by all worker processes; unset disables the shared cache
+SHARED_CACHE_PATH = os.environ.get('HARMSTATUS_SHARED_CACHE')
+
+enabled = bool(SHARED_CACHE_PATH)
+
+# One connection per thread
+local = threading.local()
+
+schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version TEXT,
+    updated REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+def connect():
+    """
+    Per-thread connection to the shared cache database
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(schema)
+        local.conn = conn
+    return conn
+
+def owner_id():
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+def process_id():
+    return str(os.getpid())
+
+def get_meta(key):
+    """
+    (version, updated) of a shared entry without loading its value, or None
+    """
+    if not enabled:
+        return None
+    return connect().execute("SELECT version, updated FROM entries WHERE key = ?", (key,)).fetchone()
+
+def get(key):
+    """
+    (version, updated, value) of a shared entry, or None
+    """
+    if not enabled:
+        return None
+    row = connect().execute("SELECT version, updated, value FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], pickle.loads(row[2])
+
+def put(key, value, version=None, updated=None):
+    """
+    Publish a value to every worker. The row is replaced in a single
+    statement, so readers see either the old or the new snapshot
+    """
+    if not enabled:
+        return
+    blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    connect().execute(
+        "INSERT OR REPLACE INTO entries (key, version, updated, value) VALUES (?, ?, ?, ?)",
+        (key, version, updated or time.time(), blob)
+    )
+
+def touch(key, updated=None):
+    """
+    Mark a shared entry as fresh without rewriting its value. Returns False
+    if there is no such entry
+    """
+    if not enabled:
+        return False
+    cursor = connect().execute("UPDATE entries SET updated = ? WHERE key = ?", (updated or time.time(), key))
+    return cursor.rowcount > 0
+
+def prune(prefix, keep):
+    """
+    Drop all but the keep most recently updated entries whose key starts with prefix
+    """
+    if not enabled:
+        return
+    connect().execute(
+        "DELETE FROM entries WHERE key LIKE ? AND key NOT IN "
+        "(SELECT key FROM entries WHERE key LIKE ? ORDER BY updated DESC LIMIT ?)",
+        (prefix + '%', prefix + '%', keep)
+    )
+
+def acquire(name, ttl, owner=None):
+    """
+    Try to take a lease for ttl seconds. Returns True if this thread (or the
+    given owner, e.g. process_id() for a lease held by every thread of a
+    process) now holds it; leases of crashed owners expire on their own
+    """
+    if not enabled:
+        return True
+    owner = owner or owner_id()
+    now = time.time()
+    conn = connect()
+    conn.execute(
+        "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+        "WHERE leases.expires < ? OR leases.owner = excluded.owner",
+        (name, owner, now + ttl, now)
+    )
+    row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == owner
+
+def release(name, owner=None):
+    if not enabled:
+        return
+    connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner or owner_id()))
+
+def get_or_build(key, build, version=None, ttl=60):
+    """
+    Return a shared value, building it in at most one worker at a time. Other
+    workers wait for the builder's result; they build it themselves only if
+    the lease expires first
+    """
+    if not enabled:
+        return build()
+
+    deadline = time.time() + ttl
+    while True:
+        entry = get(key)
+        if entry is not None:
+            return entry[2]
+        if acquire('build:' + key, ttl):
+            try:
+                value = build()
+                put(key, value, version=version)
+                return value
+            finally:
+                release('build:' + key)
+        if time.time() > deadline:
+            return build()
+        time.sleep(0.05)
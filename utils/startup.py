@@ -0,0 +1,95 @@
+# utils/startup.py
+import os
+import sys
+import time
+import logging
+import builtins
+import threading
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+# Set to 1 to time every module import, at startup and on first use
+IMPORT_PROFILE = os.environ.get('HARMSTATUS_IMPORT_PROFILE') == '1'
+
+# Startup phases as (name, seconds), measured from the import of this module
+started = time.perf_counter()
+phases = []
+startup_seconds = None  # Set once the app is ready
+
+# {module: [self seconds, total seconds, imported after startup]}
+import_times = {}
+
+# Per-thread stack of time spent in nested imports
+local = threading.local()
+original_import = builtins.__import__
+
+def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """
+    builtins.__import__ replacement recording how long each new module
+    takes to import, with and without the modules it imports in turn
+    """
+    try:
+        module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__')) if level else name
+    except (ImportError, ValueError):
+        return original_import(name, globals, locals, fromlist, level)
+    new = [
+        candidate for candidate in [module] + [f'{module}.{item}' for item in fromlist or () if item != '*']
+        if candidate not in sys.modules
+    ]
+    if not new:
+        return original_import(name, globals, locals, fromlist, level)
+
+    stack = local.__dict__.setdefault('stack', [])
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        total = time.perf_counter() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += total
+        if new[0] in sys.modules:
+            import_times.setdefault(new[0], [total - nested, total, startup_seconds is not None])
+
+if IMPORT_PROFILE:
+    builtins.__import__ = timed_import
+
+def mark(phase):
+    """
+    End a startup phase, e.g. mark('imports')
+    """
+    elapsed = time.perf_counter() - started
+    phases.append((phase, elapsed - sum(seconds for _, seconds in phases)))
+
+def finish():
+    """
+    Mark the app as ready and log the startup report
+    """
+    global startup_seconds
+    mark('app')
+    startup_seconds = time.perf_counter() - started
+    logger.info(
+        "Started in %.3fs (%s)", startup_seconds,
+        ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in phases)
+    )
+    for row in report(limit=10)['imports']:
+        logger.info("Import %s: %.1f ms (%.1f ms with its imports)", row['module'], row['self_ms'], row['total_ms'])
+
+def report(limit=30):
+    """
+    Startup time, its phases and the slowest module imports by their own
+    import time (only with HARMSTATUS_IMPORT_PROFILE=1). Imports after
+    startup are deferred imports paid by the first request that needs them
+    """
+    slowest = sorted(import_times.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    return {
+        'startup_seconds': startup_seconds,
+        'phases': dict(phases),
+        'import_profile': IMPORT_PROFILE,
+        'imports': [
+            {'module': module, 'self_ms': self_time * 1000, 'total_ms': total * 1000, 'deferred': deferred}
+            for module, (self_time, total, deferred) in slowest
+        ],
+    }
@@ -0,0 +1,27 @@
+# utils/stats.py
+from flask import Blueprint, Response, jsonify
+
+from utils import backend, metrics, refresher, startup
+from utils.cache import cache_stats
+
+stats_blueprint = Blueprint('stats', __name__)
+
+@stats_blueprint.route('/stats/cache')
+def cache_statistics():
+    return jsonify(cache_stats())
+
+@stats_blueprint.route('/stats/refresh')
+def refresh_statistics():
+    return jsonify({'running': refresher.worker is not None and refresher.worker.is_alive(), **refresher.last_refresh})
+
+@stats_blueprint.route('/stats/backend')
+def backend_statistics():
+    return jsonify(backend.breaker.stats())
+
+@stats_blueprint.route('/stats/startup')
+def startup_statistics():
+    return jsonify(startup.report())
+
+@stats_blueprint.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,229 @@
+# utils/study_db.py
+import os
+import time
+import sqlite3
+import threading
+
+from utils import schema, filter_query as filter_compiler
+from utils.filter_query import quote_identifier
+from utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# SQLite file holding the materialized study table; unset keeps the table in pandas
+STUDY_DB_PATH = os.environ.get('HARMSTATUS_STUDY_DB')
+
+enabled = bool(STUDY_DB_PATH)
+
+# Columns indexed for filtering, sorting and facet counts
+indexed_columns = [
+    'Harm_status',
+    'Genotyping_type',
+    'Effect_size_type',
+    'Harm_account',
+    'PMID',
+    'Latest_harm_start_date',
+]
+
+# Seconds a query waits for a locked database
+TIMEOUT = 30
+
+# One connection per thread
+local = threading.local()
+
+# Held while this process materializes a version
+write_lock = threading.Lock()
+
+def connect():
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(STUDY_DB_PATH, timeout=TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot (version TEXT, loaded REAL)")
+        local.conn = conn
+    return conn
+
+def current_version():
+    """
+    Version of the materialized snapshot, or None if nothing was materialized yet
+    """
+    if not enabled:
+        return None
+    row = connect().execute("SELECT version FROM snapshot").fetchone()
+    return row[0] if row else None
+
+def column_types():
+    """
+    Declared type of every study column
+    """
+    rows = connect().execute("PRAGMA table_info(studies)").fetchall()
+    return {row[1]: row[2] for row in rows if row[1] != 'row_id'}
+
+def sql_type(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return filter_compiler.sql_datetime_type
+    if pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return 'REAL'
+    return 'TEXT'
+
+def search_table():
+    """
+    (name, columns) of the FTS5 trigram index over the study table, or None
+    """
+    rows = connect().execute("PRAGMA table_info(studies_search)").fetchall()
+    return ('studies_search', {row[1] for row in rows}) if rows else None
+
+def begin_write(conn):
+    """
+    Take the database write lock without waiting for it. Returns False if
+    another connection holds it
+    """
+    conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {int(TIMEOUT * 1000)}")
+
+def materialize(version, df, search_columns=()):
+    """
+    Write a dataset version to the study table and index it, including an
+    FTS5 trigram index over search_columns for substring search. Everything
+    runs in one write transaction, so readers keep seeing the previous
+    snapshot until the commit. Only one worker materializes at a time: while
+    another one is writing, this returns False at once instead of queueing
+    behind it, and callers keep serving the previous snapshot. Returns True
+    once the version is materialized
+    """
+    if not enabled:
+        return False
+    if current_version() == version:
+        return True
+    if not write_lock.acquire(blocking=False):
+        return False
+    try:
+        conn = connect()
+        if not begin_write(conn):
+            return False
+        try:
+            if current_version() == version:
+                conn.execute("ROLLBACK")
+                return True
+
+            types = {col: sql_type(df[col]) for col in df.columns}
+            df = schema.with_text_dates(df)  # Stored as ISO text, compared like the table shows them
+            columns = ', '.join(f'{quote_identifier(col)} {types[col]}' for col in df.columns)
+            conn.execute("DROP TABLE IF EXISTS studies_search")
+            conn.execute("DROP TABLE IF EXISTS studies")
+            conn.execute(f"CREATE TABLE studies (row_id INTEGER PRIMARY KEY, {columns})")
+
+            # NaN is written as NULL
+            values = df.astype(object).where(df.notna(), None)
+            placeholders = ', '.join('?' * (len(df.columns) + 1))
+            conn.executemany(
+                f"INSERT INTO studies VALUES ({placeholders})",
+                ((row_id, *row) for row_id, row in zip(df.index.tolist(), values.itertuples(index=False, name=None)))
+            )
+
+            for col in indexed_columns:
+                if col in df.columns:
+                    conn.execute(f"CREATE INDEX {quote_identifier('studies_' + col)} ON studies ({quote_identifier(col)})")
+
+            searched = [quote_identifier(col) for col in search_columns if col in df.columns]
+            if searched:
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE studies_search USING fts5({', '.join(searched)}, "
+                    "content='studies', content_rowid='row_id', tokenize='trigram')"
+                )
+                conn.execute("INSERT INTO studies_search (studies_search) VALUES ('rebuild')")
+
+            conn.execute("DELETE FROM snapshot")
+            conn.execute("INSERT INTO snapshot VALUES (?, ?)", (version, time.time()))
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        write_lock.release()
+
+def load_frame():
+    """
+    The materialized study table as a DataFrame (used when the backend is down)
+    """
+    df = pd.read_sql_query("SELECT * FROM studies ORDER BY row_id", connect(), index_col='row_id')
+    df.index.name = None
+    return schema.apply(df)
+
+def order_clause(sort_by, types):
+    """
+    ORDER BY terms for the DataTable sort_by list. NULLs sort last in both
+    directions and ties keep row order, as in dataset.sort_table
+    """
+    terms = []
+    for col in sort_by or []:
+        if col['column_id'] in types:
+            name = quote_identifier(col['column_id'])
+            terms += [f"{name} IS NULL", f"{name} {'ASC' if col['direction'] == 'asc' else 'DESC'}"]
+    return ', '.join(terms + ['row_id'])
+
+def query_page(filter_query, sort_by, page_current, page_size, columns=None):
+    """
+    (page DataFrame indexed by row id, matching row count) for a filtered,
+    sorted page of the study table, holding only the given columns if any
+    """
+    types = column_types()
+    where, params = filter_compiler.to_sql(filter_query, types, search_table())
+    conn = connect()
+    total = conn.execute(f"SELECT COUNT(*) FROM studies WHERE {where}", params).fetchone()[0]
+
+    page_count = max(1, -(-total // page_size))
+    offset = min(page_current, page_count - 1) * page_size
+    selected = '*' if columns is None else ', '.join(
+        ['row_id'] + [quote_identifier(col) for col in columns if col in types]
+    )
+    page = pd.read_sql_query(
+        f"SELECT {selected} FROM studies WHERE {where} ORDER BY {order_clause(sort_by, types)} LIMIT ? OFFSET ?",
+        conn, params=params + [page_size, offset], index_col='row_id'
+    )
+    page.index.name = None
+    return page, total
+
+def selection_condition(selections, comparisons, types, exclude=None):
+    """
+    WHERE clause for the facet dropdown selections and numeric comparisons,
+    ignoring the column exclude
+    """
+    conditions, params = [], []
+    for col, selected in selections.items():
+        if col == exclude or not selected or col not in types:
+            continue
+        # Dropdown values are strings; compare text columns directly so their index is used
+        column = quote_identifier(col) if types[col] in ('TEXT', filter_compiler.sql_datetime_type) else f"CAST({quote_identifier(col)} AS TEXT)"
+        conditions.append(f"{column} IN ({', '.join('?' * len(selected))})")
+        params += list(selected)
+    for col, (operator, value) in comparisons.items():
+        if col == exclude or col not in types or operator not in ('>', '<', '=='):
+            continue
+        conditions.append(f"{quote_identifier(col)} {'=' if operator == '==' else operator} ?")
+        params.append(value)
+    return ' AND '.join(conditions) or '1', params
+
+def facet_counts(col, selections, comparisons):
+    """
+    {value: row count} of a column among rows matching the other filters
+    """
+    types = column_types()
+    if col not in types:
+        return {}
+    where, params = selection_condition(selections, comparisons, types, exclude=col)
+    column = quote_identifier(col)
+    rows = connect().execute(
+        f"SELECT {column}, COUNT(*) FROM studies WHERE {where} AND {column} IS NOT NULL GROUP BY {column}",
+        params
+    ).fetchall()
+    return {str(value): count for value, count in rows}